@@ -1,7 +1,16 @@
-
-from typing import Dict, List, Optional
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from heapq import heappop, heappush
+from typing import Dict, List, Optional, Set, Tuple
 from enum import Enum
-from threading import Lock
+from threading import Event, Lock, Thread
+import random
+import time
+import uuid
 
 class OrderStatus(Enum):
     PENDING = 1
@@ -11,8 +20,8 @@ class OrderStatus(Enum):
     CANCELLED = 5
 
 class OrderItem:
-    def __init_(self, quantity: int):
-        self.product = Product 
+    def __init__(self, product: Product, quantity: int):
+        self.product = product
         self.quantity = quantity
 
 
@@ -88,7 +97,18 @@ class Product:
 
 class Cart:
     def __init__(self):
-        self.items = Dict[Product, int]
+        self.items: Dict[Product, int] = {}
+
+    def add(self, product: Product, quantity: int):
+        self.items[product] = self.items.get(product, 0) + quantity
+
+    def clear(self):
+        self.items.clear()
+
+    # Empties the cart and returns what it held, for checkout
+    def take(self) -> Dict[Product, int]:
+        items, self.items = self.items, {}
+        return items
 
 class User:
     def __init__(self, email: str, name: str, phone_number: int, password: str, cart: Cart):
@@ -97,8 +117,8 @@ class User:
         self.name = name
         self.phone_number = phone_number
         self.password = password
-        self.orders = List[Order]
-        self.cart = Cart
+        self.orders: List[Order] = []
+        self.cart = cart
 
     def add_order(self, order: Order):
         self.orders.append(order)
@@ -121,6 +141,99 @@ class User:
     def get_orders(self):
         return self.orders
 
+class Payment(ABC):
+    @abstractmethod
+    def process_payment(self, amount: float) -> bool:
+        pass
+
+    # Reverses a completed charge; returns False when the processor cannot refund it
+    def refund(self, amount: float) -> bool:
+        return False
+
+class CreditCardPayment(Payment):
+    def process_payment(self, amount: float) -> bool:
+        return True
+
+    def refund(self, amount: float) -> bool:
+        return True
+
+# Stand-in payment gateway for tests and benchmarks: waits `latency` seconds, then declines
+# a `failure_rate` fraction of payments. Refunded amounts are kept in `refunds`.
+class FakePayment(Payment):
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.refunds: List[float] = []
+
+    def process_payment(self, amount: float) -> bool:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.rng.random() >= self.failure_rate
+
+    def refund(self, amount: float) -> bool:
+        self.refunds.append(amount)
+        return True
+
+# Trigram index over product names and descriptions. Each trigram of the padded, lowercased
+# text maps to an ascending posting list of document numbers (insertion order), so a query
+# only touches the products that share its trigrams instead of scanning the catalog.
+class TrigramIndex:
+    def __init__(self):
+        self.postings: Dict[str, List[int]] = {}
+        self.documents: List[Product] = []
+        self.texts: List[str] = []
+
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add_product(self, product: Product):
+        doc = len(self.documents)
+        text = f"{product.name}\n{product.description}".lower()
+        self.documents.append(product)
+        self.texts.append(text)
+        for gram in self.trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = [doc]
+            else:
+                posting.append(doc)
+
+    # Products whose name or description contains keyword (case-insensitive), in insertion order
+    def search(self, keyword: str) -> List[Product]:
+        keyword = keyword.lower()
+        if not keyword:
+            return list(self.documents)
+        if len(keyword) < 3:
+            # Too short for a whole trigram: union the postings of every trigram containing it
+            docs = sorted({doc for gram, posting in list(self.postings.items()) if keyword in gram for doc in posting})
+        else:
+            grams = {keyword[i:i + 3] for i in range(len(keyword) - 2)}
+            posting_lists = [self.postings.get(gram, []) for gram in grams]
+            posting_lists.sort(key=len)
+            docs = [doc for doc in posting_lists[0]
+                    if all(self._contains(posting, doc) for posting in posting_lists[1:])]
+        # Shared trigrams are necessary, not sufficient: confirm the substring on the candidates
+        return [self.documents[doc] for doc in docs if keyword in self.texts[doc]]
+
+    # Typo-tolerant match: products sharing at least `threshold` of the keyword's trigrams,
+    # best match first (ties in insertion order)
+    def fuzzy_search(self, keyword: str, threshold: float = 0.5, limit: Optional[int] = None) -> List[Product]:
+        grams = self.trigrams(keyword.lower())
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        needed = threshold * len(grams)
+        docs = sorted((doc for doc, count in shared.items() if count >= needed), key=lambda doc: (-shared[doc], doc))
+        return [self.documents[doc] for doc in docs[:limit]]
+
+    @staticmethod
+    def _contains(posting: List[int], doc: int) -> bool:
+        i = bisect_left(posting, doc)
+        return i < len(posting) and posting[i] == doc
+
 class OnlineShoppingService:
     _instance = None
     _lock = Lock()
@@ -129,15 +242,17 @@ class OnlineShoppingService:
         self.users: Dict[str, User] = {}
         self.products: Dict[str, Product] = {}
         self.orders: Dict[str, Order] = {}
+        self.product_index = TrigramIndex()
 
+    @classmethod
     def get_instance(cls):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = OnlineShoppingService()
             return cls._instance
 
-    def register_user(self, name: str, email: str, password: str) -> User:
-        user = User(name, email, password)
+    def register_user(self, name: str, email: str, password: str, phone_number: Optional[int] = None) -> User:
+        user = User(email, name, phone_number, password, Cart())
         self.users[user.id] = user
         return user
 
@@ -145,8 +260,9 @@ class OnlineShoppingService:
         return self.users.get(user_id)
 
     def add_product(self, name: str, description: str, price: float, stock: int) -> Product:
-        product = Product(name, description, price, stock)
+        product = Product(name, price, description, stock)
         self.products[product.id] = product
+        self.product_index.add_product(product)
         return product
 
     def add_to_cart(self, user_id: str, product_id: str, quantity: int):
@@ -165,14 +281,21 @@ class OnlineShoppingService:
     def get_product(self, product_id: str) -> Product:
         return self.products.get(product_id)
 
-    def search_products(self, keyword: str) -> List[Product]:
+    # Substring match on name or description via the trigram index; fuzzy=True tolerates typos
+    def search_products(self, keyword: str, fuzzy: bool = False, limit: Optional[int] = None) -> List[Product]:
+        if fuzzy:
+            return self.product_index.fuzzy_search(keyword, limit=limit)
+        return self.product_index.search(keyword)[:limit]
+
+    # Reference linear scan: the same matches as search_products, checking every product
+    def scan_products(self, keyword: str) -> List[Product]:
         result = []
         keyword_lower = keyword.lower()
         
         for product in self.products.values():
             product_name_lower = product.name.lower()
             
-            if keyword_lower in product_name_lower:
+            if keyword_lower in product_name_lower or keyword_lower in product.description.lower():
                 result.append(product)
         
         return result
@@ -188,7 +311,7 @@ class OnlineShoppingService:
 
             for product, quantity in items.items():
                 if product.is_available(quantity):
-                    product.decrease_stock(quantity)
+                    product.decrease_quantity(quantity)
                     order_items.append(OrderItem(product, quantity))
 
             order = Order(user, order_items)
@@ -204,7 +327,7 @@ class OnlineShoppingService:
                 for item in order_items:
                     product = item.product
                     quantity = item.quantity
-                    product.increase_stock(quantity)
+                    product.increase_quantity(quantity)
 
             return order
 
@@ -219,14 +342,273 @@ class OnlineShoppingService:
             for item in order.items:
                 product = item.product
                 quantity = item.quantity
-                product.increase_stock(quantity)
+                product.increase_quantity(quantity)
 
     def get_order(self, order_id: str) -> Order:
         return self.orders.get(order_id)
 
     def generate_order_id(self) -> str:
-        return f"ORDER{uuid4().hex[:8].upper()}"
-    
+        return f"ORDER{uuid.uuid4().hex[:8].upper()}"
+
+# Checkout without the store-wide lock. Stock is guarded by striped per-product locks, and an
+# order takes the stripes of all its products in ascending stripe order, so two orders can never
+# wait on each other in a cycle. Only the reservation (check and decrement) runs under those locks;
+# payment runs with no lock held, and a declined payment returns the stock the same way.
+class ConcurrentShoppingService(OnlineShoppingService):
+    def __init__(self, stripes: int = 64):
+        super().__init__()
+        self.stripes = [Lock() for _ in range(stripes)]
+        self.orders_lock = Lock()
+        # Orders charged after they were cancelled whose refund failed, kept for reconciliation
+        self.unrefunded_orders: List[Order] = []
+
+    def _locks_for(self, products: List[Product]) -> List[Lock]:
+        return [self.stripes[i] for i in sorted({hash(product) % len(self.stripes) for product in products})]
+
+    def _reserve(self, items: Dict[Product, int]) -> List[OrderItem]:
+        order_items = []
+        with ExitStack() as stack:
+            for lock in self._locks_for(list(items)):
+                stack.enter_context(lock)
+            for product, quantity in items.items():
+                if product.is_available(quantity):
+                    product.decrease_quantity(quantity)
+                    order_items.append(OrderItem(product, quantity))
+        return order_items
+
+    def _restock(self, order_items: List[OrderItem]):
+        with ExitStack() as stack:
+            for lock in self._locks_for([item.product for item in order_items]):
+                stack.enter_context(lock)
+            for item in order_items:
+                item.product.increase_quantity(item.quantity)
+
+    # A charge that lands after its order was cancelled cannot place it again: refund it, or
+    # record the order for reconciliation when the processor cannot
+    def _refund_late_payment(self, order: Order, payment: Payment):
+        try:
+            refunded = payment.refund(order.total_amount)
+        except Exception:
+            refunded = False
+        if not refunded:
+            with self.orders_lock:
+                self.unrefunded_orders.append(order)
+
+    # Takes the cart in one step, so a double-submitted checkout orders (and charges) it once
+    def _take_cart(self, user: User) -> Dict[Product, int]:
+        with self.orders_lock:
+            return user.cart.take()
+
+    def place_order(self, user_id: str, payment: Payment) -> Order:
+        user = self.users.get(user_id)
+        if user is None:
+            raise ValueError("User not found")
+
+        order = Order(user, self._reserve(self._take_cart(user)))
+        self.orders[order.id] = order
+        user.add_order(order)
+
+        paid = payment.process_payment(order.total_amount)
+        with self.orders_lock:
+            cancelled = order.status != OrderStatus.PENDING  # While the payment was in flight
+            if not cancelled:
+                order.status = OrderStatus.PLACED if paid else OrderStatus.CANCELLED
+        if cancelled:
+            if paid:
+                self._refund_late_payment(order, payment)
+            return order  # Stock already returned by cancel_order
+        if not paid:
+            self._restock(order.items)
+        return order
+
+    def cancel_order(self, order_id: str):
+        order = self.orders.get(order_id)
+        if order is None:
+            raise ValueError("Order not found")
+        with self.orders_lock:
+            if order.status == OrderStatus.CANCELLED:
+                return
+            order.cancel()
+        self._restock(order.items)
+
+# Stock held for a pending order until its payment settles or expires_at (time.monotonic) passes
+class Reservation:
+    def __init__(self, order: Order, expires_at: float):
+        self.order = order
+        self.expires_at = expires_at
+
+# Checkout that returns as soon as stock is reserved. The reservation lives for reservation_ttl
+# seconds while a thread-pool worker settles the payment: success places the order; a decline,
+# or a payment that outlives the TTL, cancels it and returns the stock. Expired reservations are
+# swept by a background thread every sweep_interval seconds and on each new checkout.
+# A payment that completes after its reservation expired leaves the order cancelled and is
+# refunded; failed refunds are kept in unrefunded_orders.
+class ReservingShoppingService(ConcurrentShoppingService):
+    def __init__(self, reservation_ttl: float = 900.0, workers: int = 8, sweep_interval: Optional[float] = 1.0,
+                 stripes: int = 64):
+        super().__init__(stripes)
+        self.reservation_ttl = reservation_ttl
+        self.reservations: Dict[str, Reservation] = {}
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.settlements: Dict[str, Future] = {}
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="settlement")
+        self.closed = Event()
+        self.sweeper = None
+        if sweep_interval is not None:
+            self.sweeper = Thread(target=self._sweep, args=(sweep_interval,), daemon=True)
+            self.sweeper.start()
+
+    def place_order(self, user_id: str, payment: Payment) -> Order:
+        user = self.users.get(user_id)
+        if user is None:
+            raise ValueError("User not found")
+        self.expire_reservations()
+
+        order = Order(user, self._reserve(self._take_cart(user)))
+        self.orders[order.id] = order
+        user.add_order(order)
+
+        reservation = Reservation(order, time.monotonic() + self.reservation_ttl)
+        with self.orders_lock:
+            self.reservations[order.id] = reservation
+            heappush(self.expiry_heap, (reservation.expires_at, order.id))
+        settlement = self.settlements[order.id] = self.executor.submit(self._settle, order, payment)
+        # Registered after the store: a payment that already finished runs this right away
+        settlement.add_done_callback(lambda _: self.settlements.pop(order.id, None))
+        return order
+
+    def _settle(self, order: Order, payment: Payment):
+        try:
+            paid = payment.process_payment(order.total_amount)
+        except Exception:
+            paid = False
+        if not self._finish(order, OrderStatus.PLACED if paid else OrderStatus.CANCELLED) and paid:
+            self._refund_late_payment(order, payment)
+
+    # Ends a pending reservation exactly once, whichever of settlement, expiry or cancel gets here first
+    def _finish(self, order: Order, status: OrderStatus) -> bool:
+        with self.orders_lock:
+            if self.reservations.pop(order.id, None) is None:
+                return False
+            order.status = status
+        if status == OrderStatus.CANCELLED:
+            self._restock(order.items)
+        return True
+
+    # Cancels pending orders whose reservation has expired; returns how many were released
+    def expire_reservations(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.orders_lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                _, order_id = heappop(self.expiry_heap)
+                if order_id in self.reservations:  # Otherwise already settled or cancelled
+                    expired.append(self.reservations[order_id].order)
+        return sum(self._finish(order, OrderStatus.CANCELLED) for order in expired)
+
+    def _sweep(self, interval: float):
+        while not self.closed.wait(interval):
+            self.expire_reservations()
+
+    def cancel_order(self, order_id: str):
+        order = self.orders.get(order_id)
+        if order is None:
+            raise ValueError("Order not found")
+        if not self._finish(order, OrderStatus.CANCELLED):
+            super().cancel_order(order_id)
+
+    # Blocks until the order's payment has been processed, then returns its status
+    def wait_for_settlement(self, order_id: str, timeout: Optional[float] = None) -> OrderStatus:
+        settlement = self.settlements.get(order_id)
+        if settlement is not None:
+            settlement.result(timeout)
+        return self.orders[order_id].status
+
+    def close(self):
+        self.closed.set()
+        self.executor.shutdown(wait=True)
+        if self.sweeper is not None:
+            self.sweeper.join()
+
+# Checkout latency seen by the caller: synchronous payment (ConcurrentShoppingService) against
+# reserve-and-return (ReservingShoppingService), with a payment that takes payment_latency seconds
+def benchmark_checkout_latency(checkouts: int = 200, products: int = 100, payment_latency: float = 0.01,
+                               failure_rate: float = 0.1, seed: int = 0):
+    for service in (ConcurrentShoppingService(), ReservingShoppingService(workers=16, sweep_interval=None)):
+        rng = random.Random(seed)
+        catalog = [service.add_product(f"Product {i}", "Benchmark product", 10, 1_000_000) for i in range(products)]
+        user = service.register_user("buyer", "buyer@example.com", "password")
+        payment = FakePayment(payment_latency, failure_rate, seed)
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(checkouts):
+            user.cart.add(rng.choice(catalog), 1)
+            began = time.perf_counter()
+            service.place_order(user.id, payment)
+            latencies.append(time.perf_counter() - began)
+        if isinstance(service, ReservingShoppingService):
+            service.close()
+        seconds = time.perf_counter() - start
+        latencies.sort()
+        placed = sum(order.status == OrderStatus.PLACED for order in service.orders.values())
+        print(f"{type(service).__name__:26} median {latencies[len(latencies) // 2] * 1000:7.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.3f} ms, {placed}/{checkouts} placed "
+              f"in {seconds:.2f}s")
+
+# Checkouts/sec for the store-wide lock against per-product locks as threads are added. Each
+# checkout buys 1-3 random products with a payment that takes `payment_latency` seconds; stock
+# is re-checked afterwards against the placed orders.
+def benchmark_checkouts(thread_counts: List[int] = (1, 2, 4, 8, 16), checkouts: int = 800, products: int = 1_000,
+                        payment_latency: float = 0.002, seed: int = 0):
+    for service_class in (OnlineShoppingService, ConcurrentShoppingService):
+        for threads in thread_counts:
+            service = service_class()
+            catalog = [service.add_product(f"Product {i}", "Benchmark product", 10, 1_000_000) for i in range(products)]
+
+            def checkout(worker: int):
+                rng = random.Random(seed + worker)
+                payment = FakePayment(payment_latency)
+                user = service.register_user(f"user{worker}", f"user{worker}@example.com", "password")
+                for _ in range(checkouts // threads):
+                    for product in rng.sample(catalog, rng.randint(1, 3)):
+                        user.cart.add(product, rng.randint(1, 3))
+                    service.place_order(user.id, payment)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(checkout, range(threads)))
+            seconds = time.perf_counter() - start
+
+            sold = Counter()
+            for order in service.orders.values():
+                if order.status == OrderStatus.PLACED:
+                    for item in order.items:
+                        sold[item.product] += item.quantity
+            assert all(product.quantity + sold[product] == 1_000_000 for product in catalog)
+            total = threads * (checkouts // threads)
+            print(f"{service_class.__name__:26} {threads:>2} threads: {total / seconds:8,.0f} checkouts/sec")
+
+# Query latency of search_products (substring and fuzzy) against scan_products as the catalog grows
+def benchmark_product_search(sizes: List[int] = (1_000, 10_000, 100_000), queries: int = 200, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 9))) for _ in range(5_000)]
+    for size in sizes:
+        service = OnlineShoppingService()
+        for i in range(size):
+            service.add_product(" ".join(rng.choices(vocabulary, k=3)), " ".join(rng.choices(vocabulary, k=12)),
+                                rng.randint(1, 1000), rng.randint(0, 100))
+        keywords = [rng.choice(vocabulary)[:rng.randint(3, 6)] for _ in range(queries)]
+        typos = [word[:2] + word[3:] for word in rng.choices(vocabulary, k=queries)]
+        timings = {}
+        for name, search, terms in (("scan", service.scan_products, keywords),
+                                    ("trigram", service.search_products, keywords),
+                                    ("fuzzy", lambda word: service.search_products(word, fuzzy=True, limit=10), typos)):
+            start = time.perf_counter()
+            for term in terms:
+                search(term)
+            timings[name] = (time.perf_counter() - start) / queries * 1000
+        print(f"{size:>9,} products: scan {timings['scan']:8.3f} ms, trigram {timings['trigram']:8.3f} ms, "
+              f"fuzzy {timings['fuzzy']:8.3f} ms per query")
 
 
 shopping_service = OnlineShoppingService.get_instance()
@@ -253,6 +635,10 @@ print("Search Results:")
 for product in search_results:
     print(product.name)
 
+# Typo-tolerant search
+print(f"Fuzzy 'smartphnoe': {[product.name for product in shopping_service.search_products('smartphnoe', fuzzy=True)]}")
+print(f"Description 'gaming': {[product.name for product in shopping_service.search_products('gaming')]}")
+
 # User views order history
 user_orders = user1.orders
 print("User 1 Order History:")
@@ -261,5 +647,27 @@ for order in user_orders:
     print(f"Total Amount: ${order.total_amount:.2f}")
     print(f"Status: {order.status.name}")
 
+# Reserve now, settle later: checkout returns a PENDING order, and stock comes back if the
+# payment is declined or does not settle within the reservation's TTL
+reserving_service = ReservingShoppingService(reservation_ttl=0.05, sweep_interval=0.01)
+buyer = reserving_service.register_user("Sam Lee", "sam@example.com", "password789")
+camera = reserving_service.add_product("Camera", "Mirrorless camera", 749.99, 3)
+reserving_service.add_to_cart(buyer.id, camera.id, 2)
+fast_order = reserving_service.place_order(buyer.id, FakePayment(latency=0.01))
+print(f"\nCheckout returned {fast_order.status.name}; {camera.quantity} cameras left unreserved")
+print(f"After settlement: {reserving_service.wait_for_settlement(fast_order.id).name}")
+reserving_service.add_to_cart(buyer.id, camera.id, 1)
+slow_payment = FakePayment(latency=0.2)
+slow_order = reserving_service.place_order(buyer.id, slow_payment)
+time.sleep(0.1)
+print(f"Slow payment past the TTL: {slow_order.status.name}; {camera.quantity} cameras left")
+reserving_service.close()
+assert slow_order.status == OrderStatus.CANCELLED and camera.quantity == 1
+assert slow_payment.refunds == [slow_order.total_amount] and not reserving_service.unrefunded_orders
+
+# benchmark_product_search()
+# benchmark_checkouts()
+# benchmark_checkout_latency()
+
 
 
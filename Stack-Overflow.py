@@ -28,10 +28,55 @@
 # Votable
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Dict, List, Optional
-
+from heapq import heappop, heappush, merge, nlargest
+from itertools import count, islice
+from io import StringIO
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+import csv
+import gc
+import json
+import marshal
+import math
+import os
+import pickle
+import random
+import re
+import struct
+import time
+import tracemalloc
+
+try:
+    import numpy as np
+except ImportError:  # Optional: ReputationLedger.recompute falls back to a Python loop
+    np = None
+
+# Points per unit of each reputation event; vote events carry the change in the voter's vote (+/-1 or +/-2)
+REPUTATION_RULES: Dict[str, int] = {"question": 5, "answer": 10, "comment": 2, "question_vote": 5, "answer_vote": 10}
+
+# Snapshot segment: magic, kind, payload length, then a marshal-encoded dict of columns.
+# A snapshot file is one full segment followed by any number of append-only deltas.
+SNAPSHOT_MAGIC = b"SOSN"
+SNAPSHOT_FULL, SNAPSHOT_DELTA = 0, 1
+SNAPSHOT_HEADER = struct.Struct("<4sB3xQ")
+
+# Search terms are lowercase alphanumeric runs, keeping trailing +/# so "c++" and "c#" survive
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+[+#]*")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+# Entities use __slots__ (no per-instance __dict__) and take IDs from a per-class counter:
+# monotonic, never reused after GC and independent of memory addresses
 class Commentable(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def add_comment(self, comment: Comment) -> None:
         pass
@@ -40,6 +85,8 @@ class Commentable(ABC):
         pass
 
 class Votable(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def add_vote(self, user: User, value: int) -> None:
         pass
@@ -47,57 +94,103 @@ class Votable(ABC):
     def get_votes(self) -> int:
         pass
 
+    # Shared O(1) bookkeeping: votes maps voter user_id -> Vote and score is kept as a running total
+    # Returns the change in score, so a changed vote reverses the earlier one
+    def _record_vote(self, user: User, value: int) -> int:
+        if value not in [-1, 1]:
+            raise ValueError("Vote value must be either 1 or -1")
+        previous = self.votes.get(user.user_id)
+        change = value - previous.value if previous is not None else value
+        self.votes[user.user_id] = Vote(user.user_id, value)
+        self.score += change
+        return change
+
+    # Replays many votes, crediting the author's reputation once for the whole batch
+    def add_votes(self, votes: Iterable[Tuple[User, int]]) -> None:
+        votes = list(votes)
+        if any(value not in [-1, 1] for _, value in votes):
+            raise ValueError("Vote value must be either 1 or -1")
+        self.user.earn(self.reputation_kind, sum(self._record_vote(user, value) for user, value in votes))
+
 class User:
-    def __init__(self, user_id: int, user_name: str, email: str):
+    __slots__ = ("user_id", "user_name", "email", "reputation", "ledger", "questions", "comments", "answers",
+                 "activity")
+
+    def __init__(self, user_id: int, user_name: str, email: str, ledger: Optional[ReputationLedger] = None):
         self.user_id: int = user_id
         self.user_name: str = user_name
         self.email: str = email
         self.reputation: int = 0
+        self.ledger: Optional[ReputationLedger] = ledger
         self.questions: List[Question] = []
         self.comments: List[Comment] = []
         self.answers: List[Answer] = []
+        self.activity: List[Union[Question, Answer, Comment]] = []   # Everything posted, oldest first
 
-    def post_question(self, title: str, content: str, tags: List[str]) -> Question:
-        question = Question(title, self, content, tags)
+    def post_question(self, title: str, content: str, tags: List[str],
+                      tag_registry: Optional[Dict[str, Tag]] = None) -> Question:
+        question = Question(title, self, content, tags, tag_registry)
         self.questions.append(question)
-        self.update_reputation(5)
+        self.activity.append(question)
+        self.earn("question")
         return question
 
     def post_answer(self, question: Question, content: str) -> Answer:
         answer = Answer(self, content, question)
         self.answers.append(answer)
+        self.activity.append(answer)
         question.add_answer(answer)
-        self.update_reputation(10)
+        self.earn("answer")
         return answer
 
     def post_comment(self, commentable: Commentable, content: str) -> Comment:
         comment = Comment(content, self)
         self.comments.append(comment)
+        self.activity.append(comment)
         commentable.add_comment(comment)
-        self.update_reputation(2)
+        self.earn("comment")
         return comment
 
+    # Reputation events go through the ledger when the user has one, else straight onto the total
+    def earn(self, kind: str, units: int = 1) -> None:
+        if self.ledger is not None:
+            self.ledger.record(self, kind, units)
+        else:
+            self.update_reputation(REPUTATION_RULES[kind] * units)
+
     def update_reputation(self, value: int) -> None:
         self.reputation += value
         if self.reputation < 0:
             self.reputation = 0
 
 class Comment:
+    __slots__ = ("id", "user", "content", "creation_date")
+    _ids = count(1)
+
     def __init__(self, content: str, user: User):
-        self.id: int = id(self)
+        self.id: int = next(Comment._ids)
         self.user: User = user
         self.content: str = content
+        self.creation_date: datetime = datetime.now()
 
 class Question(Commentable, Votable):
-    def __init__(self, title: str, user: User, content: str, tag_names: List[str]):
-        self.id: int = id(self)
+    __slots__ = ("id", "title", "user", "content", "creation_date", "last_activity", "tags", "answers",
+                 "votes", "score", "comments")
+    _ids = count(1)
+    reputation_kind: str = "question_vote"
+
+    def __init__(self, title: str, user: User, content: str, tag_names: List[str],
+                 tag_registry: Optional[Dict[str, Tag]] = None):
+        self.id: int = next(Question._ids)
         self.title: str = title
         self.user: User = user
         self.content: str = content
         self.creation_date: datetime = datetime.now()
-        self.tags: List[Tag] = [Tag(tag_name) for tag_name in tag_names]
+        self.last_activity: datetime = self.creation_date
+        self.tags: List[Tag] = [Tag.intern(tag_name, tag_registry) for tag_name in dict.fromkeys(tag_names)]
         self.answers: List[Answer] = []
-        self.votes: List[Vote] = []
+        self.votes: Dict[int, Vote] = {}
+        self.score: int = 0
         self.comments: List[Comment] = []
 
     def add_answer(self, answer: Answer) -> None:
@@ -105,14 +198,10 @@ class Question(Commentable, Votable):
             self.answers.append(answer)
 
     def add_vote(self, user: User, value: int) -> None:
-        if value not in [-1, 1]:
-            raise ValueError("Vote value must be either 1 or -1")
-        self.votes = [v for v in self.votes if v.user != user]
-        self.votes.append(Vote(user, value))
-        self.user.update_reputation(value * 5)
+        self.user.earn(self.reputation_kind, self._record_vote(user, value))
 
     def get_votes(self) -> int:
-        return sum(v.value for v in self.votes)
+        return self.score
 
     def add_comment(self, comment: Comment) -> None:
         self.comments.append(comment)
@@ -121,30 +210,58 @@ class Question(Commentable, Votable):
         return self.comments.copy()
 
 class Tag:
+    __slots__ = ("name", "questions", "related")
+
     def __init__(self, name: str):
         self.name: str = name
+        self.questions: List[Question] = []    # Posting list in post order
+        self.related: Dict[str, int] = {}      # Co-occurring tag name -> shared question count
+
+    # One Tag per name: reuse the registry's instance when there is a registry
+    @classmethod
+    def intern(cls, name: str, registry: Optional[Dict[str, Tag]]) -> Tag:
+        if registry is None:
+            return cls(name)
+        tag = registry.get(name)
+        if tag is None:
+            tag = registry[name] = cls(name)
+        return tag
+
+    def add_question(self, question: Question) -> None:
+        self.questions.append(question)
+        for other in question.tags:
+            if other is not self:
+                self.related[other.name] = self.related.get(other.name, 0) + 1
 
+    def get_question_count(self) -> int:
+        return len(self.questions)
+
+# Stores the voter's ID rather than the User, so a vote is two small ints
 class Vote:
-    def __init__(self, user: User, value: int):
+    __slots__ = ("user_id", "value")
+
+    def __init__(self, user_id: int, value: int):
+        self.user_id: int = user_id
         self.value: int = value
-        self.user: User = user
 
 class Answer(Commentable, Votable):
+    __slots__ = ("id", "user", "content", "creation_date", "question", "comments", "votes", "score", "is_accepted")
+    _ids = count(1)
+    reputation_kind: str = "answer_vote"
+
     def __init__(self, user: User, content: str, question: Question):
-        self.id: int = id(self)
+        self.id: int = next(Answer._ids)
         self.user: User = user
         self.content: str = content
+        self.creation_date: datetime = datetime.now()
         self.question: Question = question
         self.comments: List[Comment] = []
-        self.votes: List[Vote] = []
+        self.votes: Dict[int, Vote] = {}
+        self.score: int = 0
         self.is_accepted: bool = False
 
     def add_vote(self, user: User, value: int) -> None:
-        if value not in [-1, 1]:
-            raise ValueError("Vote value must be either 1 or -1")
-        self.votes = [v for v in self.votes if v.user != user]
-        self.votes.append(Vote(user, value))
-        self.user.update_reputation(value * 10)
+        self.user.earn(self.reputation_kind, self._record_vote(user, value))
 
     def add_comment(self, comment: Comment) -> None:
         self.comments.append(comment)
@@ -155,50 +272,553 @@ class Answer(Commentable, Votable):
         self.is_accepted = True
 
     def get_votes(self) -> int:
-        return sum(v.value for v in self.votes)
+        return self.score
 
     def get_comments(self) -> List[Comment]:
         return self.comments.copy()
 
+# Append-only log of reputation events in parallel typed columns (user ID, kind code, units).
+# Per-user raw totals are kept current as events arrive, and user.reputation is materialized
+# as max(0, total) so reads stay O(1). recompute() rebuilds every total from the log, e.g. after
+# a rule change, with one vectorized bincount when numpy is available.
+class ReputationLedger:
+    KINDS: Tuple[str, ...] = tuple(REPUTATION_RULES)
+
+    def __init__(self, rules: Optional[Dict[str, int]] = None):
+        self.rules: Dict[str, int] = dict(REPUTATION_RULES if rules is None else rules)
+        self.kind_codes: Dict[str, int] = {kind: code for code, kind in enumerate(self.KINDS)}
+        self.user_ids = array("q")
+        self.kinds = array("b")
+        self.units = array("q")
+        self.users: Dict[int, User] = {}
+        self.totals: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def record(self, user: User, kind: str, units: int = 1) -> None:
+        self.record_many([(user, kind, units)])
+
+    # Appends a batch of (user, kind, units) events and settles each affected user once
+    def record_many(self, events: Iterable[Tuple[User, str, int]]) -> None:
+        deltas: Dict[User, int] = {}
+        for user, kind, units in events:
+            code = self.kind_codes.get(kind)
+            if code is None:
+                raise ValueError(f"Unknown reputation event kind: {kind}")
+            if units == 0:
+                continue
+            self.user_ids.append(user.user_id)
+            self.kinds.append(code)
+            self.units.append(units)
+            deltas[user] = deltas.get(user, 0) + self.rules.get(kind, 0) * units
+        for user, delta in deltas.items():
+            self.users[user.user_id] = user
+            total = self.totals[user.user_id] = self.totals.get(user.user_id, 0) + delta
+            user.reputation = max(0, total)
+
+    # Rebuilds every user's total from the log, optionally switching to new rules first
+    def recompute(self, rules: Optional[Dict[str, int]] = None) -> None:
+        if rules is not None:
+            self.rules = dict(rules)
+        weights = [self.rules.get(kind, 0) for kind in self.KINDS]
+        if np is not None and self.units:
+            points = np.frombuffer(self.units, dtype=np.int64) * np.array(weights, dtype=np.int64)[
+                np.frombuffer(self.kinds, dtype=np.int8)]
+            user_ids, slots = np.unique(np.frombuffer(self.user_ids, dtype=np.int64), return_inverse=True)
+            sums = np.bincount(slots, weights=points, minlength=len(user_ids))
+            self.totals = dict(zip(user_ids.tolist(), sums.astype(np.int64).tolist()))
+        else:
+            totals: Dict[int, int] = {}
+            for user_id, code, units in zip(self.user_ids, self.kinds, self.units):
+                totals[user_id] = totals.get(user_id, 0) + weights[code] * units
+            self.totals = totals
+        for user_id, user in self.users.items():
+            user.reputation = max(0, self.totals.get(user_id, 0))
+
+# Ledger for ConcurrentStackOverflow: the columns and totals are shared by every user, so appends
+# and recomputes are serialized behind one lock (never held while taking another)
+class LockedReputationLedger(ReputationLedger):
+    def __init__(self, rules: Optional[Dict[str, int]] = None):
+        super().__init__(rules)
+        self.lock = Lock()
+
+    def record_many(self, events: Iterable[Tuple[User, str, int]]) -> None:
+        events = list(events)
+        with self.lock:
+            super().record_many(events)
+
+    def recompute(self, rules: Optional[Dict[str, int]] = None) -> None:
+        with self.lock:
+            super().recompute(rules)
+
+# Inverted index over question titles, bodies and tag names.
+# Each term maps to an ascending posting list of document numbers (post order).
+class SearchIndex:
+    def __init__(self):
+        self.postings: Dict[str, List[int]] = {}
+        self.documents: List[Question] = []
+
+    def add_question(self, question: Question) -> Set[str]:
+        doc = len(self.documents)
+        self.documents.append(question)
+        terms = set(tokenize(question.title))
+        terms.update(tokenize(question.content))
+        for tag in question.tags:
+            terms.update(tokenize(tag.name))
+        for term in terms:
+            if term in self.postings:
+                self.postings[term].append(doc)
+            else:
+                self.postings[term] = [doc]
+        return terms
+
+    def search(self, query: str, mode: str = "and") -> List[Question]:
+        return self.search_terms(set(tokenize(query)), mode)
+
+    def search_terms(self, terms: Set[str], mode: str = "and") -> List[Question]:
+        if mode not in ("and", "or"):
+            raise ValueError("Search mode must be 'and' or 'or'")
+        posting_lists = [self.postings.get(term, []) for term in terms]
+        if not posting_lists:
+            return []
+        if mode == "or":
+            docs = sorted(set().union(*posting_lists))
+        else:
+            # Walk the shortest list and binary-search the rest
+            posting_lists.sort(key=len)
+            docs = [doc for doc in posting_lists[0]
+                    if all(self._contains(postings, doc) for postings in posting_lists[1:])]
+        return [self.documents[doc] for doc in docs]
+
+    # Lazily yields matching document numbers newest first, starting below `before` when given
+    # (keyset pagination). AND walks the shortest list backwards; OR merges lists backwards.
+    def iter_docs(self, terms: Set[str], mode: str = "and", before: Optional[int] = None) -> Iterator[int]:
+        if mode not in ("and", "or"):
+            raise ValueError("Search mode must be 'and' or 'or'")
+        return self._iter_docs([self.postings.get(term, []) for term in terms], mode, before)
+
+    def _iter_docs(self, posting_lists: List[List[int]], mode: str, before: Optional[int]) -> Iterator[int]:
+        if not posting_lists:
+            return
+
+        def newest_first(postings: List[int]) -> Iterator[int]:
+            end = len(postings) if before is None else bisect_left(postings, before)
+            return (postings[i] for i in range(end - 1, -1, -1))
+
+        if mode == "and":
+            posting_lists.sort(key=len)
+            for doc in newest_first(posting_lists[0]):
+                if all(self._contains(postings, doc) for postings in posting_lists[1:]):
+                    yield doc
+        else:
+            previous = None
+            for doc in merge(*map(newest_first, posting_lists), reverse=True):
+                if doc != previous:
+                    yield doc
+                    previous = doc
+
+    @staticmethod
+    def _contains(postings: List[int], doc: int) -> bool:
+        i = bisect_left(postings, doc)
+        return i < len(postings) and postings[i] == doc
+
+# Bounded LRU cache of search results keyed by (sorted query terms, mode). A reverse map
+# from term to cached keys lets a new question drop only the entries it would now match.
+class SearchCache:
+    def __init__(self, capacity: int = 4096):
+        self.capacity: int = capacity
+        self.entries: OrderedDict[Tuple[Tuple[str, ...], str], List[Question]] = OrderedDict()
+        self.keys_by_term: Dict[str, Set[Tuple[Tuple[str, ...], str]]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+
+    def get(self, key: Tuple[Tuple[str, ...], str]) -> Optional[List[Question]]:
+        results = self.entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def put(self, key: Tuple[Tuple[str, ...], str], results: List[Question]) -> None:
+        if self.capacity <= 0:
+            return
+        self.entries[key] = results
+        self.entries.move_to_end(key)
+        for term in key[0]:
+            self.keys_by_term.setdefault(term, set()).add(key)
+        while len(self.entries) > self.capacity:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    # Drops cached queries that a new document with these terms would match
+    def invalidate(self, terms: Set[str]) -> None:
+        stale = set()
+        for term in terms:
+            for key in self.keys_by_term.get(term, ()):
+                query_terms, mode = key
+                if mode == "or" or all(query_term in terms for query_term in query_terms):
+                    stale.add(key)
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+
+    def _remove(self, key: Tuple[Tuple[str, ...], str]) -> None:
+        del self.entries[key]
+        for term in key[0]:
+            keys = self.keys_by_term[term]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_term[term]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+# Case-insensitive prefix lookup over one user field (name or email): a sorted list of
+# (key, user_id) searched with bisect. New entries wait in an unsorted tail that is merged
+# (one Timsort pass over a sorted run plus the tail) on the next search, so bulk loads stay O(n log n).
+class PrefixIndex:
+    def __init__(self):
+        self.entries: List[Tuple[str, int]] = []
+        self.pending: List[Tuple[str, int]] = []
+
+    def add(self, key: str, user_id: int) -> None:
+        self.pending.append((key.lower(), user_id))
+
+    def _settle(self) -> None:
+        if len(self.pending) == 1:
+            insort(self.entries, self.pending[0])
+        elif self.pending:
+            self.entries.extend(self.pending)
+            self.entries.sort()
+        self.pending = []
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        self._settle()
+        prefix = prefix.lower()
+        user_ids: List[int] = []
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and self.entries[i][0].startswith(prefix) and len(user_ids) != limit:
+            user_ids.append(self.entries[i][1])
+            i += 1
+        return user_ids
+
+    # Exact (case-insensitive) matches only
+    def lookup(self, key: str) -> List[int]:
+        self._settle()
+        key = key.lower()
+        user_ids: List[int] = []
+        i = bisect_left(self.entries, (key,))
+        while i < len(self.entries) and self.entries[i][0] == key:
+            user_ids.append(self.entries[i][1])
+            i += 1
+        return user_ids
+
+# Ranks keys (post IDs) by a score that changes over time. Updates push a new heap entry
+# and bump the key's version; entries whose version is no longer current are skipped and
+# dropped when popped, so top(n) costs O((n + stale) log M) and the heap is compacted
+# once it holds twice as many entries as live keys.
+class RankingIndex:
+    def __init__(self):
+        self.heap: List[Tuple[float, int, int]] = []   # (-score, version, key)
+        self.current: Dict[int, int] = {}              # key -> live version
+        self.version: int = 0
+
+    def update(self, key: int, score: float) -> None:
+        self.version += 1
+        self.current[key] = self.version
+        heappush(self.heap, (-score, self.version, key))
+        if len(self.heap) > 2 * len(self.current) + 64:
+            self.heap = [entry for entry in self.heap if self.current.get(entry[2]) == entry[1]]
+            self.heap.sort()
+
+    def top(self, n: int) -> List[int]:
+        keys: List[int] = []
+        live: List[Tuple[float, int, int]] = []
+        while self.heap and len(keys) < n:
+            entry = heappop(self.heap)
+            if self.current.get(entry[2]) != entry[1]:
+                continue  # Superseded by a later update
+            live.append(entry)
+            keys.append(entry[2])
+        for entry in live:
+            heappush(self.heap, entry)
+        return keys
+
+# Time-decayed "hot" rank: log-scaled score plus a bonus for newer posts. Newer questions
+# need ever more votes to be outranked, and the value never changes without a vote, so it
+# can live in a RankingIndex.
+def hotness(score: int, creation_date: datetime) -> float:
+    order = math.log10(max(abs(score), 1))
+    sign = 1 if score > 0 else -1 if score < 0 else 0
+    return sign * order + creation_date.timestamp() / 45000
+
+def _column(typecode: str, values: Iterable[Any]) -> bytes:
+    return array(typecode, values).tobytes()
+
+def _unpack_column(typecode: str, blob: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(blob)
+    return column
+
+# Packs entities into one segment. Each entity is a row of parallel columns that refers to
+# others by ID only, so the cyclic object graph flattens without recursion. `posts` carries
+# the mutable state (votes, accepted flag, last activity) that replaces the stored state on load.
+def _pack_snapshot_segment(kind: int, next_user_id: int, users: List[User], questions: List[Question],
+                           answers: List[Answer], comments: List[Tuple[Comment, Union[Question, Answer]]],
+                           posts: List[Union[Question, Answer]], ledger: ReputationLedger, ledger_start: int) -> bytes:
+    votes = [vote for post in posts for vote in post.votes.values()]
+    payload = marshal.dumps({
+        "next_user_id": next_user_id,
+        "user_id": _column("q", (user.user_id for user in users)),
+        "user_name": [user.user_name for user in users],
+        "email": [user.email for user in users],
+        "question_id": _column("q", (question.id for question in questions)),
+        "question_user": _column("q", (question.user.user_id for question in questions)),
+        "title": [question.title for question in questions],
+        "question_content": [question.content for question in questions],
+        "created": _column("d", (question.creation_date.timestamp() for question in questions)),
+        "tags": [[tag.name for tag in question.tags] for question in questions],
+        "answer_id": _column("q", (answer.id for answer in answers)),
+        "answer_user": _column("q", (answer.user.user_id for answer in answers)),
+        "answer_question": _column("q", (answer.question.id for answer in answers)),
+        "answer_content": [answer.content for answer in answers],
+        "answer_created": _column("d", (answer.creation_date.timestamp() for answer in answers)),
+        "comment_id": _column("q", (comment.id for comment, _ in comments)),
+        "comment_user": _column("q", (comment.user.user_id for comment, _ in comments)),
+        "comment_on_answer": _column("b", (isinstance(post, Answer) for _, post in comments)),
+        "comment_post": _column("q", (post.id for _, post in comments)),
+        "comment_content": [comment.content for comment, _ in comments],
+        "comment_created": _column("d", (comment.creation_date.timestamp() for comment, _ in comments)),
+        "post_on_answer": _column("b", (isinstance(post, Answer) for post in posts)),
+        "post_id": _column("q", (post.id for post in posts)),
+        "accepted": _column("b", (isinstance(post, Answer) and post.is_accepted for post in posts)),
+        "activity": _column("d", (post.last_activity.timestamp() if isinstance(post, Question) else 0.0
+                                  for post in posts)),
+        "vote_count": _column("q", (len(post.votes) for post in posts)),
+        "voter": _column("q", (vote.user_id for vote in votes)),
+        "vote_value": _column("b", (vote.value for vote in votes)),
+        "rules": ledger.rules,
+        "ledger_user": ledger.user_ids[ledger_start:].tobytes(),
+        "ledger_kind": ledger.kinds[ledger_start:].tobytes(),
+        "ledger_units": ledger.units[ledger_start:].tobytes(),
+    })
+    return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, kind, len(payload)) + payload
+
+def _iter_snapshot_segments(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path, "rb") as stream:
+        while True:
+            header = stream.read(SNAPSHOT_HEADER.size)
+            if not header:
+                return
+            magic, kind, size = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a StackOverflow snapshot segment in {path}")
+            yield kind, marshal.loads(stream.read(size))
+
+# Replaces a class's ID counter so new IDs continue after those loaded from a snapshot
+def _advance_ids(cls: type, last_id: int) -> None:
+    cls._ids = count(max(next(cls._ids), last_id + 1))
+
 class StackOverflow:
     def __init__(self):
         self.users: Dict[int, User] = {}
+        self.next_user_id: int = 1
+        self.users_by_name = PrefixIndex()
+        self.users_by_email = PrefixIndex()
         self.questions: Dict[int, Question] = {}
         self.answers: Dict[int, Answer] = {}
         self.tags: Dict[str, Tag] = {}
+        self.search_index = SearchIndex()
+        self.search_cache = SearchCache()
+        # Front-page rankings, keyed by question ID, and top answers per question ID
+        self.questions_by_score = RankingIndex()
+        self.questions_by_activity = RankingIndex()
+        self.questions_by_hotness = RankingIndex()
+        self.answers_by_score: Dict[int, RankingIndex] = {}
+        self.reputation_ledger = ReputationLedger()
+        # Snapshot state: posts changed and users added since the last save (None/empty until a
+        # save or load), the highest IDs already on disk, and links/indexes still to build after
+        # load_snapshot. Users are tracked explicitly: bulk loads keep dump IDs, so a new user's
+        # ID can be below next_user_id at the last save.
+        self.snapshot_path: Optional[str] = None
+        self.dirty_posts: Optional[Set[Union[Question, Answer]]] = None
+        self.unsaved_users: List[User] = []
+        self.snapshot_marks: Dict[str, int] = {}
+        self.pending_links: Optional[Tuple[List[Question], List[Answer],
+                                           List[Tuple[Comment, Union[Question, Answer]]]]] = None
+        self.pending_index: Optional[Tuple[List[Question], List[Answer]]] = None
 
     def create_user(self, username: str, email: str) -> User:
-        user_id = len(self.users) + 1
-        user = User(user_id, username, email)
-        self.users[user_id] = user
+        user_id = self.next_user_id
+        self.next_user_id += 1
+        user = User(user_id, username, email, self.reputation_ledger)
+        self._add_user(user)
         return user
 
+    def _add_user(self, user: User) -> None:
+        self.users[user.user_id] = user
+        self.users_by_name.add(user.user_name, user.user_id)
+        self.users_by_email.add(user.email, user.user_id)
+        if self.dirty_posts is not None:
+            self.unsaved_users.append(user)
+
+    # Users whose name (by="name") or email (by="email") starts with prefix, case-insensitive, in key order
+    def find_users(self, prefix: str, by: str = "name", limit: Optional[int] = 20) -> List[User]:
+        indexes = {"name": self.users_by_name, "email": self.users_by_email}
+        if by not in indexes:
+            raise ValueError("Lookup must be by 'name' or 'email'")
+        return [self.users[user_id] for user_id in indexes[by].search(prefix, limit)]
+
+    def get_user_by_name(self, user_name: str) -> Optional[User]:
+        for user_id in self.users_by_name.lookup(user_name):
+            if self.users[user_id].user_name == user_name:
+                return self.users[user_id]
+        return None
+
     def post_question(self, user: User, title: str, content: str, tags: List[str]) -> Question:
-        question = user.post_question(title, content, tags)
+        self._materialize()
+        question = user.post_question(title, content, tags, self.tags)
         self.questions[question.id] = question
         for tag in question.tags:
-            if tag.name not in self.tags:
-                self.tags[tag.name] = tag
+            tag.add_question(question)
+        self.search_cache.invalidate(self.search_index.add_question(question))
+        self._rank_question(question)
+        self.questions_by_activity.update(question.id, question.last_activity.timestamp())
         return question
 
     def post_answer(self, user: User, question: Question, content: str) -> Answer:
+        self._materialize()
         answer = user.post_answer(question, content)
         self.answers[answer.id] = answer
+        self._rank_answer(answer)
+        self._touch(question)
         return answer
 
     def add_comment(self, user: User, commentable: Commentable, content: str) -> Comment:
-        return user.post_comment(commentable, content)
+        self._materialize()
+        comment = user.post_comment(commentable, content)
+        self._mark_dirty(commentable)
+        self._touch(commentable if isinstance(commentable, Question) else commentable.question)
+        return comment
 
     def vote_question(self, user: User, question: Question, value: int) -> None:
         question.add_vote(user, value)
+        self._rank_question(question)
+        self._touch(question)
 
     def vote_answer(self, user: User, answer: Answer, value: int) -> None:
         answer.add_vote(user, value)
+        self._rank_answer(answer)
+        self._touch(answer.question)
+
+    def _rank_question(self, question: Question) -> None:
+        self.questions_by_score.update(question.id, question.get_votes())
+        self.questions_by_hotness.update(question.id, hotness(question.get_votes(), question.creation_date))
+
+    def _rank_answer(self, answer: Answer) -> None:
+        self._mark_dirty(answer)
+        ranking = self.answers_by_score.get(answer.question.id)
+        if ranking is None:
+            ranking = self.answers_by_score[answer.question.id] = RankingIndex()
+        ranking.update(answer.id, answer.get_votes())
+
+    # Records activity on a question (new answer, comment or vote) for the "active" list
+    def _touch(self, question: Question) -> None:
+        self._mark_dirty(question)
+        question.last_activity = datetime.now()
+        self.questions_by_activity.update(question.id, question.last_activity.timestamp())
+
+    # Remembers a post whose votes, comments or activity changed, for the next incremental snapshot
+    def _mark_dirty(self, post: Union[Question, Answer]) -> None:
+        if self.dirty_posts is not None:
+            self.dirty_posts.add(post)
+
+    # Front-page list: by "score", most recent "activity", or time-decayed "hot" rank
+    def get_top_questions(self, n: int = 10, by: str = "hot") -> List[Question]:
+        self._materialize()
+        rankings = {"score": self.questions_by_score, "activity": self.questions_by_activity,
+                    "hot": self.questions_by_hotness}
+        if by not in rankings:
+            raise ValueError("Ranking must be one of 'score', 'activity' or 'hot'")
+        return [self.questions[question_id] for question_id in rankings[by].top(n)]
+
+    def get_top_answers(self, question: Question, n: int = 10) -> List[Answer]:
+        self._materialize()
+        ranking = self.answers_by_score.get(question.id)
+        if ranking is None:
+            return []
+        return [self.answers[answer_id] for answer_id in ranking.top(n)]
+
+    # Batch replay of (voter, question or answer, value) triples, grouped per post
+    def apply_votes(self, votes: Iterable[Tuple[User, Votable, int]]) -> None:
+        by_post: Dict[int, Tuple[Votable, List[Tuple[User, int]]]] = {}
+        for user, post, value in votes:
+            by_post.setdefault(id(post), (post, []))[1].append((user, value))
+        for post, post_votes in by_post.values():
+            post.add_votes(post_votes)
+            if isinstance(post, Question):
+                self._rank_question(post)
+                self._touch(post)
+            else:
+                self._rank_answer(post)
+                self._touch(post.question)
+
+    # Re-derives all reputation from the ledger, e.g. after changing the points per event
+    def recompute_reputation(self, rules: Optional[Dict[str, int]] = None) -> None:
+        self.reputation_ledger.recompute(rules)
 
     def accept_answer(self, answer: Answer) -> None:
         answer.mark_as_accepted()
-
-    def search_questions(self, query: str) -> List[Question]:
+        self._mark_dirty(answer)
+
+    # Term search over titles, bodies and tags; mode "and" needs every query term, "or" any
+    # Served from search_cache when possible; callers get their own copy of the result list
+    def search_questions(self, query: str, mode: str = "and") -> List[Question]:
+        self._materialize()
+        terms = set(tokenize(query))
+        key = (tuple(sorted(terms)), mode)
+        results = self.search_cache.get(key)
+        if results is None:
+            results = self.search_index.search_terms(terms, mode)
+            if terms:
+                self.search_cache.put(key, results)
+        return list(results)
+
+    # Streams matches newest first without materializing the full result list
+    def iter_search(self, query: str, mode: str = "and") -> Iterator[Question]:
+        self._materialize()
+        documents = self.search_index.documents
+        return (documents[doc] for doc in self.search_index.iter_docs(set(tokenize(query)), mode))
+
+    def search_page(self, query: str, limit: int = 20, offset: int = 0, cursor: Optional[int] = None,
+                    mode: str = "and", sort: str = "date") -> Tuple[List[Question], Optional[int]]:
+        """Return one page of matches and the cursor for the next page (None when exhausted).
+
+        sort="date" streams newest first, so a page costs O(offset + limit) posting steps
+        however many questions match; pass the returned cursor instead of a growing offset.
+        sort="score" must rank every match: O(matches * log(offset + limit)).
+        """
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        self._materialize()
+        terms = set(tokenize(query))
+        if sort == "score":
+            matches = self.search_index.search_terms(terms, mode)
+            return nlargest(offset + limit, matches, key=lambda question: question.get_votes())[offset:], None
+        if sort != "date":
+            raise ValueError("Sort must be 'date' or 'score'")
+        docs = list(islice(self.search_index.iter_docs(terms, mode, before=cursor), offset, offset + limit + 1))
+        next_cursor = docs[limit - 1] if len(docs) > limit else None
+        return [self.search_index.documents[doc] for doc in docs[:limit]], next_cursor
+
+    # Reference linear scan: substring match on title/content or exact tag match
+    def scan_questions(self, query: str) -> List[Question]:
         query = query.lower()
         results: List[Question] = []
 
@@ -213,20 +833,776 @@ class StackOverflow:
         return results
 
     def get_questions_by_users(self, user: User) -> List[Question]:
+        self._materialize()
         return user.questions
 
+    def iter_questions_by_user(self, user: User) -> Iterator[Question]:
+        self._materialize()
+        return reversed(user.questions)
+
+    # Newest-first page is a slice, O(limit); sort="score" ranks all of the user's questions
+    def page_questions_by_user(self, user: User, limit: int = 20, offset: int = 0,
+                               sort: str = "date") -> List[Question]:
+        self._materialize()
+        if sort == "score":
+            return nlargest(offset + limit, user.questions, key=lambda question: question.get_votes())[offset:]
+        if sort != "date":
+            raise ValueError("Sort must be 'date' or 'score'")
+        end = len(user.questions) - offset
+        if end <= 0:
+            return []
+        return user.questions[max(end - limit, 0):end][::-1]
+
+    # Newest-first page of everything a user posted (questions, answers and comments), O(limit).
+    # The cursor is a position in user.activity, which only grows, so pages never shift.
+    def activity_page(self, user: User, limit: int = 20,
+                      cursor: Optional[int] = None) -> Tuple[List[Union[Question, Answer, Comment]], Optional[int]]:
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        self._materialize()
+        end = len(user.activity) if cursor is None else min(cursor, len(user.activity))
+        start = max(end - limit, 0)
+        return user.activity[start:end][::-1], start if start > 0 else None
+
+    def bulk_load(self, source: Union[str, TextIO], format: str = "jsonl") -> Dict[str, Any]:
+        self._materialize()
+        return BulkLoader(self).load(source, format)
+
+    def save_snapshot(self, path: str, incremental: bool = False) -> None:
+        """Checkpoint users, posts, comments, votes and the reputation ledger to path.
+
+        A full snapshot rewrites the file. incremental=True appends a delta segment holding
+        the entities created since the last save or load of this same file, the current votes
+        and state of every post changed since then, and the new ledger events.
+        """
+        self._materialize()
+        if incremental:
+            if self.dirty_posts is None or self.snapshot_path != path:
+                raise ValueError(f"No base snapshot at {path}; save a full snapshot first")
+            marks = self.snapshot_marks
+            users = list(self.unsaved_users)
+            questions = [question for question in self.questions.values() if question.id > marks["question"]]
+            answers = [answer for answer in self.answers.values() if answer.id > marks["answer"]]
+            posts = list(dict.fromkeys([*self.dirty_posts, *questions, *answers]))
+            comments = [(comment, post) for post in posts for comment in post.comments if comment.id > marks["comment"]]
+            kind, mode, ledger_start = SNAPSHOT_DELTA, "ab", marks["ledger"]
+        else:
+            users = list(self.users.values())
+            questions = list(self.questions.values())
+            answers = list(self.answers.values())
+            posts = [*questions, *answers]
+            comments = [(comment, post) for post in posts for comment in post.comments]
+            kind, mode, ledger_start = SNAPSHOT_FULL, "wb", 0
+        questions.sort(key=lambda question: question.id)
+        answers.sort(key=lambda answer: answer.id)
+        comments.sort(key=lambda pair: pair[0].id)
+        segment = _pack_snapshot_segment(kind, self.next_user_id, users, questions, answers, comments, posts,
+                                         self.reputation_ledger, ledger_start)
+        with open(path, mode) as stream:
+            stream.write(segment)
+        self._reset_snapshot_marks(path, questions, answers, comments)
+
+    # Marks advance to the highest IDs actually written, never to whatever is registered by now
+    def _reset_snapshot_marks(self, path: str, questions: List[Question], answers: List[Answer],
+                              comments: List[Tuple[Comment, Union[Question, Answer]]]) -> None:
+        marks = self.snapshot_marks
+        self.snapshot_path = path
+        self.dirty_posts = set()
+        self.unsaved_users = []
+        self.snapshot_marks = {
+            "question": max([marks.get("question", 0), *(question.id for question in questions)]),
+            "answer": max([marks.get("answer", 0), *(answer.id for answer in answers)]),
+            "comment": max([marks.get("comment", 0), *(comment.id for comment, _ in comments)]),
+            "ledger": len(self.reputation_ledger),
+        }
+
+    def load_snapshot(self, path: str) -> None:
+        """Replace this system's contents with the snapshot at path plus its deltas, in order.
+
+        Entities, forward references (question.user, answer.question), votes, scores and
+        reputation are restored up front. Back-references (user.questions, question.answers,
+        comments, activity) are linked on the first get_user/get_question/get_answer or any
+        other call that reads them. The search, tag and ranking indexes, the bulk of the
+        rebuild, wait for the first search, listing or ranking query.
+        """
+        ledger = type(self.reputation_ledger)(self.reputation_ledger.rules)
+        self.users, self.questions, self.answers, self.tags = {}, {}, {}, {}
+        self.users_by_name, self.users_by_email = PrefixIndex(), PrefixIndex()
+        self.search_index, self.search_cache = SearchIndex(), SearchCache(self.search_cache.capacity)
+        self.questions_by_score, self.questions_by_activity = RankingIndex(), RankingIndex()
+        self.questions_by_hotness, self.answers_by_score = RankingIndex(), {}
+        self.reputation_ledger = ledger
+        comments: List[Tuple[Comment, Union[Question, Answer]]] = []
+
+        # The cyclic GC is paused while loading: every row allocates objects that point into the
+        # graph, which would otherwise trigger repeated full scans of everything loaded so far.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for segment, (kind, data) in enumerate(_iter_snapshot_segments(path)):
+                if (kind == SNAPSHOT_FULL) != (segment == 0):
+                    raise ValueError(f"{path} must hold one full segment followed by deltas")
+                self._apply_snapshot_segment(data, comments)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        ledger.users = dict(self.users)
+        ledger.recompute()
+        _advance_ids(Question, max(self.questions, default=0))
+        _advance_ids(Answer, max(self.answers, default=0))
+        _advance_ids(Comment, max((comment.id for comment, _ in comments), default=0))
+        self.pending_links = (list(self.questions.values()), list(self.answers.values()), comments)
+        self.pending_index = (list(self.questions.values()), list(self.answers.values()))
+        self.snapshot_marks = {}
+        self._reset_snapshot_marks(path, self.pending_index[0], self.pending_index[1], comments)
+
+    def _apply_snapshot_segment(self, data: Dict[str, Any],
+                                comments: List[Tuple[Comment, Union[Question, Answer]]]) -> None:
+        ledger = self.reputation_ledger
+        self.next_user_id = data["next_user_id"]
+        for user_id, user_name, email in zip(_unpack_column("q", data["user_id"]), data["user_name"], data["email"]):
+            self._add_user(User(user_id, user_name, email, ledger))
+        for question_id, user_id, title, content, created, tags in zip(
+                _unpack_column("q", data["question_id"]), _unpack_column("q", data["question_user"]),
+                data["title"], data["question_content"], _unpack_column("d", data["created"]), data["tags"]):
+            question = Question(title, self.users[user_id], content, tags, self.tags)
+            question.id = question_id
+            question.creation_date = question.last_activity = datetime.fromtimestamp(created)
+            self.questions[question_id] = question
+        for answer_id, user_id, question_id, content, created in zip(
+                _unpack_column("q", data["answer_id"]), _unpack_column("q", data["answer_user"]),
+                _unpack_column("q", data["answer_question"]), data["answer_content"],
+                _unpack_column("d", data["answer_created"])):
+            answer = Answer(self.users[user_id], content, self.questions[question_id])
+            answer.id = answer_id
+            answer.creation_date = datetime.fromtimestamp(created)
+            self.answers[answer_id] = answer
+        for comment_id, user_id, on_answer, post_id, content, created in zip(
+                _unpack_column("q", data["comment_id"]), _unpack_column("q", data["comment_user"]),
+                _unpack_column("b", data["comment_on_answer"]), _unpack_column("q", data["comment_post"]),
+                data["comment_content"], _unpack_column("d", data["comment_created"])):
+            comment = Comment(content, self.users[user_id])
+            comment.id = comment_id
+            comment.creation_date = datetime.fromtimestamp(created)
+            comments.append((comment, self.answers[post_id] if on_answer else self.questions[post_id]))
+
+        voters, values = _unpack_column("q", data["voter"]), _unpack_column("b", data["vote_value"])
+        offset = 0
+        for on_answer, post_id, accepted, activity, vote_count in zip(
+                _unpack_column("b", data["post_on_answer"]), _unpack_column("q", data["post_id"]),
+                _unpack_column("b", data["accepted"]), _unpack_column("d", data["activity"]),
+                _unpack_column("q", data["vote_count"])):
+            post = self.answers[post_id] if on_answer else self.questions[post_id]
+            post.votes = {voter: Vote(voter, value) for voter, value in
+                          zip(voters[offset:offset + vote_count], values[offset:offset + vote_count])}
+            post.score = sum(values[offset:offset + vote_count])
+            offset += vote_count
+            if on_answer:
+                post.is_accepted = bool(accepted)
+            else:
+                post.last_activity = datetime.fromtimestamp(activity)
+
+        ledger.rules = data["rules"]
+        ledger.user_ids.frombytes(data["ledger_user"])
+        ledger.kinds.frombytes(data["ledger_kind"])
+        ledger.units.frombytes(data["ledger_units"])
+
+    # First stage of what load_snapshot deferred: back-reference lists and activity timelines.
+    # pending_links is cleared only once the lists are complete, so None always means "built".
+    def _link(self) -> None:
+        if self.pending_links is None:
+            return
+        questions, answers, comments = self.pending_links
+        for question in questions:
+            question.user.questions.append(question)
+        for answer in answers:
+            answer.user.answers.append(answer)
+            answer.question.answers.append(answer)
+        for comment, post in comments:
+            comment.user.comments.append(comment)
+            post.comments.append(comment)
+        by_date = lambda entity: entity.creation_date
+        for user in self.users.values():
+            user.activity = list(merge(user.questions, user.answers, user.comments, key=by_date))
+        self.pending_links = None
+
+    # Everything load_snapshot deferred: links, then tag lists, search index and rankings
+    def _materialize(self) -> None:
+        self._link()
+        if self.pending_index is None:
+            return
+        questions, answers = self.pending_index
+        for question in questions:
+            for tag in question.tags:
+                tag.add_question(question)
+            self.search_index.add_question(question)
+            self.questions_by_score.update(question.id, question.score)
+            self.questions_by_hotness.update(question.id, hotness(question.score, question.creation_date))
+            self.questions_by_activity.update(question.id, question.last_activity.timestamp())
+        for answer in answers:
+            ranking = self.answers_by_score.get(answer.question.id)
+            if ranking is None:
+                ranking = self.answers_by_score[answer.question.id] = RankingIndex()
+            ranking.update(answer.id, answer.score)
+        self.pending_index = None
+
     def get_user(self, user_id: int) -> Optional[User]:
+        self._link()
         return self.users.get(user_id)
 
     def get_question(self, question_id: int) -> Optional[Question]:
+        self._link()
         return self.questions.get(question_id)
 
     def get_answer(self, answer_id: int) -> Optional[Answer]:
+        self._link()
         return self.answers.get(answer_id)
 
     def get_tag(self, name: str) -> Optional[Tag]:
+        self._materialize()
         return self.tags.get(name)
 
+    # Newest-first page of a tag's questions, O(page_size)
+    def questions_by_tag(self, name: str, page: int = 0, page_size: int = 20) -> List[Question]:
+        self._materialize()
+        tag = self.tags.get(name)
+        if tag is None or page < 0:
+            return []
+        end = len(tag.questions) - page * page_size
+        if end <= 0:
+            return []
+        return tag.questions[max(end - page_size, 0):end][::-1]
+
+    # Tags most often used alongside `name`, with shared question counts
+    def related_tags(self, name: str, n: int = 10) -> List[Tuple[str, int]]:
+        self._materialize()
+        tag = self.tags.get(name)
+        if tag is None:
+            return []
+        return nlargest(n, tag.related.items(), key=lambda item: item[1])
+
+
+# StackOverflow that can be shared by a thread pool.
+# Posts are guarded by striped locks (hash of the post), so votes, answers and comments on
+# different posts proceed independently. The shared indexes each have their own lock:
+# index_lock (tag registry, search index and cache), ranking_lock (RankingIndex heaps) and the
+# ledger's lock. Lock order is always stripe -> shared lock, and shared locks only nest as
+# index_lock -> ranking_lock -> link_lock (when materializing a snapshot), so there is no
+# cycle to deadlock on.
+# User IDs are allocated, and the name/email prefix indexes updated and searched, under id_lock.
+# save_snapshot takes every lock in that order and can run while serving. bulk_load and
+# load_snapshot rebuild the shared state wholesale without locking: run them before the
+# service starts taking calls.
+class ConcurrentStackOverflow(StackOverflow):
+    def __init__(self, stripes: int = 64):
+        super().__init__()
+        self.reputation_ledger = LockedReputationLedger()
+        self.stripes: List[Lock] = [Lock() for _ in range(stripes)]
+        self.id_lock = Lock()
+        self.index_lock = Lock()
+        self.ranking_lock = Lock()
+        self.link_lock = Lock()
+
+    def _lock_for(self, post: Union[Question, Answer]) -> Lock:
+        return self.stripes[hash(post) % len(self.stripes)]
+
+    # Callers materialize before taking any other lock; index_lock -> ranking_lock -> link_lock
+    # is the only nesting. The unlocked checks only skip finished builds: the base methods clear
+    # pending_* after building, and re-check it under the lock so a waiting thread never rebuilds.
+    def _materialize(self) -> None:
+        if self.pending_index is None and self.pending_links is None:
+            return
+        with self.index_lock, self.ranking_lock:
+            super()._materialize()
+
+    def _link(self) -> None:
+        if self.pending_links is None:
+            return
+        with self.link_lock:
+            super()._link()
+
+    def create_user(self, username: str, email: str) -> User:
+        with self.id_lock:
+            user_id = self.next_user_id
+            self.next_user_id += 1
+            user = User(user_id, username, email, self.reputation_ledger)
+            self._add_user(user)
+        return user
+
+    # Searching merges pending prefix entries, so it shares the lock that create_user adds them under
+    def find_users(self, prefix: str, by: str = "name", limit: Optional[int] = 20) -> List[User]:
+        with self.id_lock:
+            return super().find_users(prefix, by, limit)
+
+    def get_user_by_name(self, user_name: str) -> Optional[User]:
+        with self.id_lock:
+            return super().get_user_by_name(user_name)
+
+    def post_question(self, user: User, title: str, content: str, tags: List[str]) -> Question:
+        self._materialize()
+        with self.index_lock:
+            question = user.post_question(title, content, tags, self.tags)
+            self.questions[question.id] = question
+            for tag in question.tags:
+                tag.add_question(question)
+            self.search_cache.invalidate(self.search_index.add_question(question))
+        with self._lock_for(question):
+            self._rank_question(question)
+        with self.ranking_lock:
+            self.questions_by_activity.update(question.id, question.last_activity.timestamp())
+        return question
+
+    # Answers and comments get their IDs and become reachable for save_snapshot under the
+    # stripe, so a save, which holds every stripe, never sees a later ID without an earlier one
+    def post_answer(self, user: User, question: Question, content: str) -> Answer:
+        self._materialize()
+        with self._lock_for(question):
+            answer = user.post_answer(question, content)
+            self.answers[answer.id] = answer
+        with self._lock_for(answer):
+            self._rank_answer(answer)
+        self._touch(question)
+        return answer
+
+    def add_comment(self, user: User, commentable: Commentable, content: str) -> Comment:
+        self._materialize()
+        with self._lock_for(commentable):
+            comment = user.post_comment(commentable, content)
+            self._mark_dirty(commentable)
+        self._touch(commentable if isinstance(commentable, Question) else commentable.question)
+        return comment
+
+    # The post's lock covers the vote and its re-rank, so rankings never see a stale score
+    def vote_question(self, user: User, question: Question, value: int) -> None:
+        with self._lock_for(question):
+            question.add_vote(user, value)
+            self._rank_question(question)
+        self._touch(question)
+
+    def vote_answer(self, user: User, answer: Answer, value: int) -> None:
+        with self._lock_for(answer):
+            answer.add_vote(user, value)
+            self._rank_answer(answer)
+        self._touch(answer.question)
+
+    def apply_votes(self, votes: Iterable[Tuple[User, Votable, int]]) -> None:
+        by_post: Dict[int, Tuple[Votable, List[Tuple[User, int]]]] = {}
+        for user, post, value in votes:
+            by_post.setdefault(id(post), (post, []))[1].append((user, value))
+        for post, post_votes in by_post.values():
+            with self._lock_for(post):
+                post.add_votes(post_votes)
+                if isinstance(post, Question):
+                    self._rank_question(post)
+                else:
+                    self._rank_answer(post)
+            self._touch(post if isinstance(post, Question) else post.question)
+
+    def accept_answer(self, answer: Answer) -> None:
+        with self._lock_for(answer):
+            answer.mark_as_accepted()
+        self._mark_dirty(answer)
+
+    def _rank_question(self, question: Question) -> None:
+        with self.ranking_lock:
+            super()._rank_question(question)
+
+    def _rank_answer(self, answer: Answer) -> None:
+        with self.ranking_lock:
+            super()._rank_answer(answer)
+
+    def _touch(self, question: Question) -> None:
+        with self.ranking_lock:
+            super()._touch(question)
+
+    # RankingIndex.top pops stale heap entries, so reads also need the lock
+    def get_top_questions(self, n: int = 10, by: str = "hot") -> List[Question]:
+        self._materialize()
+        with self.ranking_lock:
+            return super().get_top_questions(n, by)
+
+    def get_top_answers(self, question: Question, n: int = 10) -> List[Answer]:
+        self._materialize()
+        with self.ranking_lock:
+            return super().get_top_answers(question, n)
+
+    # The cache reorders on every hit; posting lists are append-only, so streaming reads need no lock
+    def search_questions(self, query: str, mode: str = "and") -> List[Question]:
+        self._materialize()
+        with self.index_lock:
+            return super().search_questions(query, mode)
+
+    # post_question appends to tag lists and bumps Tag.related counts under index_lock
+    def questions_by_tag(self, name: str, page: int = 0, page_size: int = 20) -> List[Question]:
+        self._materialize()
+        with self.index_lock:
+            return super().questions_by_tag(name, page, page_size)
+
+    def related_tags(self, name: str, n: int = 10) -> List[Tuple[str, int]]:
+        self._materialize()
+        with self.index_lock:
+            return super().related_tags(name, n)
+
+    # Stops the world: every stripe in ascending order, then each shared lock in the documented order
+    def save_snapshot(self, path: str, incremental: bool = False) -> None:
+        self._materialize()
+        with ExitStack() as stack:
+            for lock in [*self.stripes, self.index_lock, self.ranking_lock, self.id_lock,
+                         self.reputation_ledger.lock]:
+                stack.enter_context(lock)
+            super().save_snapshot(path, incremental)
+
+# Checks a system's registries, vote totals, rankings and reputation against each other
+def check_invariants(system: StackOverflow, users: int, questions: int, answers: int) -> None:
+    assert len(system.users) == users and sorted(system.users) == list(range(1, users + 1))
+    assert len(system.questions) == len(system.search_index.documents) == questions
+    assert len(system.answers) == sum(len(question.answers) for question in system.questions.values()) == answers
+    posts: List[Union[Question, Answer]] = [*system.questions.values(), *system.answers.values()]
+    for post in posts:
+        assert post.score == sum(vote.value for vote in post.votes.values())
+    if system.questions:
+        best = system.get_top_questions(1, by="score")[0]
+        assert best.score == max(question.score for question in system.questions.values())
+    rules = system.reputation_ledger.rules
+    for user in system.users.values():
+        expected = (rules["question"] * len(user.questions) + rules["answer"] * len(user.answers)
+                    + rules["comment"] * len(user.comments)
+                    + sum(rules[post.reputation_kind] * post.score for post in [*user.questions, *user.answers]))
+        assert system.reputation_ledger.totals.get(user.user_id, 0) == expected
+        assert user.reputation == max(0, expected)
+
+# Drives a ConcurrentStackOverflow from a thread pool with a mixed workload, checks the
+# invariants after each run and reports throughput per thread count
+def stress_test_concurrent(thread_counts: Tuple[int, ...] = (1, 2, 4, 8), operations: int = 40_000,
+                           users: int = 200, questions: int = 500, seed: int = 0) -> None:
+    for threads in thread_counts:
+        system = ConcurrentStackOverflow()
+        with ThreadPoolExecutor(threads) as pool:
+            people = list(pool.map(lambda i: system.create_user(f"user{i}", f"user{i}@example.com"), range(users)))
+        posted = [system.post_question(people[i % users], f"Question {i}", f"Body {i}", [f"tag{i % 20}"])
+                  for i in range(questions)]
+
+        def worker(worker_seed: int) -> Tuple[int, int]:
+            rng = random.Random(worker_seed)
+            asked = answered = 0
+            for _ in range(operations // threads):
+                roll, user, question = rng.random(), rng.choice(people), rng.choice(posted)
+                if roll < 0.5:
+                    system.vote_question(user, question, rng.choice([1, 1, -1]))
+                elif roll < 0.7 and question.answers:
+                    system.vote_answer(user, rng.choice(question.answers), rng.choice([1, 1, -1]))
+                elif roll < 0.8:
+                    system.post_answer(user, question, "Answer")
+                    answered += 1
+                elif roll < 0.9:
+                    system.add_comment(user, question, "Comment")
+                elif roll < 0.95:
+                    system.post_question(user, "Follow-up question", "Body", ["follow-up"])
+                    asked += 1
+                else:
+                    system.search_questions(f"question {rng.randrange(questions)}")
+            return asked, answered
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(worker, range(seed, seed + threads)))
+        seconds = time.perf_counter() - start
+        check_invariants(system, users, questions + sum(asked for asked, _ in results),
+                         sum(answered for _, answered in results))
+        total = threads * (operations // threads)
+        print(f"{threads} thread(s): {total / seconds:,.0f} ops/sec, invariants hold")
+
+# Streams a data dump into a StackOverflow registry without the per-call side effects.
+# Records are JSON lines (or CSV rows with the same field names, tags "|"-separated), each
+# with a "type" and dump IDs, parents before children:
+#   user: id, name, email             question: id, user_id, title, content, tags, [creation_date]
+#   answer: id, user_id, question_id, content, [accepted]
+#   comment: user_id, post_type ("question" / "answer"), post_id, content
+#   vote: user_id, post_type, post_id, value
+# Entities are linked and indexed as they stream in. Rankings and reputation are computed
+# once at the end from the final state. Records pointing at unknown IDs are skipped and counted.
+# A dump user keeps its ID unless the system already has that ID; then it gets the next free
+# ID instead, and the report counts it under "remapped_users".
+class BulkLoader:
+    def __init__(self, system: StackOverflow):
+        self.system = system
+        self.users: Dict[Any, User] = {}
+        self.posts: Dict[Tuple[str, Any], Union[Question, Answer]] = {}
+        self.counts: Dict[str, int] = {}
+        self.remapped_users: int = 0
+
+    def load(self, source: Union[str, TextIO], format: str = "jsonl") -> Dict[str, Any]:
+        if format not in ("jsonl", "csv"):
+            raise ValueError("Format must be 'jsonl' or 'csv'")
+        stream = open(source, newline="") if isinstance(source, str) else source
+        start = time.perf_counter()
+        try:
+            records = map(json.loads, stream) if format == "jsonl" else csv.DictReader(stream)
+            handlers = {"user": self._load_user, "question": self._load_question, "answer": self._load_answer,
+                        "comment": self._load_comment, "vote": self._load_vote}
+            for record in records:
+                kind = record.get("type")
+                loaded = kind in handlers and handlers[kind](record)
+                key = kind if loaded else "skipped"
+                self.counts[key] = self.counts.get(key, 0) + 1
+        finally:
+            if stream is not source:
+                stream.close()
+        self._finish()
+        seconds = time.perf_counter() - start
+        records = sum(self.counts.values())
+        return {**self.counts, "records": records, "remapped_users": self.remapped_users, "seconds": seconds,
+                "records_per_sec": records / seconds if seconds else 0.0}
+
+    def _load_user(self, record: Dict[str, Any]) -> bool:
+        user_id = int(record["id"])
+        if user_id in self.system.users:
+            user_id = self.system.next_user_id
+            self.remapped_users += 1
+        user = User(user_id, record["name"], record["email"], self.system.reputation_ledger)
+        self.system._add_user(user)
+        self.system.next_user_id = max(self.system.next_user_id, user_id + 1)
+        self.users[record["id"]] = user
+        return True
+
+    def _load_question(self, record: Dict[str, Any]) -> bool:
+        user = self.users.get(record["user_id"])
+        if user is None:
+            return False
+        tags = record.get("tags") or []
+        if isinstance(tags, str):
+            tags = tags.split("|")
+        question = Question(record["title"], user, record["content"], tags, self.system.tags)
+        if record.get("creation_date"):
+            question.creation_date = question.last_activity = datetime.fromisoformat(record["creation_date"])
+        user.questions.append(question)
+        user.activity.append(question)
+        self.system.questions[question.id] = question
+        for tag in question.tags:
+            tag.add_question(question)
+        self.system.search_cache.invalidate(self.system.search_index.add_question(question))
+        self.posts[("question", record["id"])] = question
+        return True
+
+    def _load_answer(self, record: Dict[str, Any]) -> bool:
+        user = self.users.get(record["user_id"])
+        question = self.posts.get(("question", record["question_id"]))
+        if user is None or question is None:
+            return False
+        answer = Answer(user, record["content"], question)
+        answer.is_accepted = record.get("accepted") in (True, "true", "True", "1")
+        user.answers.append(answer)
+        user.activity.append(answer)
+        question.answers.append(answer)
+        self.system.answers[answer.id] = answer
+        self.posts[("answer", record["id"])] = answer
+        return True
+
+    def _load_comment(self, record: Dict[str, Any]) -> bool:
+        user = self.users.get(record["user_id"])
+        post = self.posts.get((record["post_type"], record["post_id"]))
+        if user is None or post is None:
+            return False
+        comment = Comment(record["content"], user)
+        user.comments.append(comment)
+        user.activity.append(comment)
+        post.add_comment(comment)
+        return True
+
+    def _load_vote(self, record: Dict[str, Any]) -> bool:
+        user = self.users.get(record["user_id"])
+        post = self.posts.get((record["post_type"], record["post_id"]))
+        if user is None or post is None:
+            return False
+        post._record_vote(user, int(record["value"]))
+        return True
+
+    # One pass over everything loaded: rankings, then one ledger batch built from final counts and scores
+    def _finish(self) -> None:
+        events: List[Tuple[User, str, int]] = []
+        for post in self.posts.values():
+            if isinstance(post, Question):
+                self.system._rank_question(post)
+                self.system.questions_by_activity.update(post.id, post.last_activity.timestamp())
+            else:
+                self.system._rank_answer(post)
+            events.append((post.user, post.reputation_kind, post.score))
+        for user in self.users.values():
+            events.append((user, "question", len(user.questions)))
+            events.append((user, "answer", len(user.answers)))
+            events.append((user, "comment", len(user.comments)))
+        self.system.reputation_ledger.record_many(events)
+
+# Writes a synthetic JSONL dump for BulkLoader
+def generate_dump(users: int = 1000, questions: int = 10_000, answers: int = 20_000, comments: int = 20_000,
+                  votes: int = 100_000, seed: int = 0) -> StringIO:
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    tag_names = [f"tag{i}" for i in range(100)]
+    lines = [json.dumps({"type": "user", "id": i, "name": f"user{i}", "email": f"user{i}@example.com"})
+             for i in range(1, users + 1)]
+    for i in range(questions):
+        lines.append(json.dumps({"type": "question", "id": i, "user_id": rng.randint(1, users),
+                                 "title": " ".join(rng.choices(vocabulary, k=8)),
+                                 "content": " ".join(rng.choices(vocabulary, k=40)),
+                                 "tags": rng.sample(tag_names, 3)}))
+    for i in range(answers):
+        lines.append(json.dumps({"type": "answer", "id": i, "user_id": rng.randint(1, users),
+                                 "question_id": rng.randrange(questions), "content": "answer"}))
+    for _ in range(comments):
+        post_type = rng.choice(["question", "answer"])
+        lines.append(json.dumps({"type": "comment", "user_id": rng.randint(1, users), "post_type": post_type,
+                                 "post_id": rng.randrange(questions if post_type == "question" else answers),
+                                 "content": "comment"}))
+    for _ in range(votes):
+        post_type = rng.choice(["question", "answer"])
+        lines.append(json.dumps({"type": "vote", "user_id": rng.randint(1, users), "post_type": post_type,
+                                 "post_id": rng.randrange(questions if post_type == "question" else answers),
+                                 "value": rng.choice([1, 1, 1, -1])}))
+    return StringIO("\n".join(lines) + "\n")
+
+# Compares BulkLoader against replaying the same dump through the public API
+def benchmark_bulk_load(**dump_options: int) -> None:
+    dump = generate_dump(**dump_options)
+
+    start = time.perf_counter()
+    replayed = StackOverflow()
+    users: Dict[int, User] = {}
+    posts: Dict[Tuple[str, int], Union[Question, Answer]] = {}
+    for record in map(json.loads, dump):
+        kind = record["type"]
+        if kind == "user":
+            users[record["id"]] = replayed.create_user(record["name"], record["email"])
+        elif kind == "question":
+            posts[("question", record["id"])] = replayed.post_question(
+                users[record["user_id"]], record["title"], record["content"], record["tags"])
+        elif kind == "answer":
+            posts[("answer", record["id"])] = replayed.post_answer(
+                users[record["user_id"]], posts[("question", record["question_id"])], record["content"])
+        elif kind == "comment":
+            replayed.add_comment(users[record["user_id"]], posts[(record["post_type"], record["post_id"])],
+                                 record["content"])
+        elif record["post_type"] == "question":
+            replayed.vote_question(users[record["user_id"]], posts[("question", record["post_id"])], record["value"])
+        else:
+            replayed.vote_answer(users[record["user_id"]], posts[("answer", record["post_id"])], record["value"])
+    api_seconds = time.perf_counter() - start
+
+    dump.seek(0)
+    report = StackOverflow().bulk_load(dump)
+    print(f"Public API replay: {report['records'] / api_seconds:,.0f} records/sec")
+    print(f"BulkLoader:        {report['records_per_sec']:,.0f} records/sec ({api_seconds / report['seconds']:.1f}x)")
+
+# Times a full reputation recompute from the ledger (numpy bincount when installed)
+def benchmark_reputation_recompute(events: int = 1_000_000, users: int = 10_000, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    ledger = ReputationLedger()
+    people = [User(user_id, f"user{user_id}", f"user{user_id}@example.com") for user_id in range(users)]
+    kinds = ReputationLedger.KINDS
+    ledger.record_many((rng.choice(people), rng.choice(kinds), rng.choice([1, 1, -1])) for _ in range(events))
+    start = time.perf_counter()
+    ledger.recompute({**REPUTATION_RULES, "question_vote": 10})
+    seconds = time.perf_counter() - start
+    engine = "numpy" if np is not None else "python"
+    print(f"Recomputed {users:,} users from {len(ledger):,} events in {seconds * 1000:.1f} ms ({engine})")
+
+# Compares retained memory for votes and comments in the __slots__ layout against
+# dict-backed stand-ins shaped like the previous classes (Vote holding the voter's User)
+def benchmark_entity_memory(votes: int = 1_000_000, comments: int = 250_000, users: int = 10_000,
+                            seed: int = 0) -> None:
+    class DictVote:
+        def __init__(self, user: User, value: int):
+            self.value = value
+            self.user = user
+
+    class DictComment:
+        def __init__(self, content: str, user: User):
+            self.id = id(self)
+            self.user = user
+            self.content = content
+
+    rng = random.Random(seed)
+    people = [User(user_id, f"user{user_id}", f"user{user_id}@example.com") for user_id in range(users)]
+    voters = [rng.choice(people) for _ in range(votes)]
+    authors = [rng.choice(people) for _ in range(comments)]
+    layouts = {
+        "dict-backed": lambda: ([DictVote(voter, 1) for voter in voters],
+                                [DictComment("comment", author) for author in authors]),
+        "__slots__": lambda: ([Vote(voter.user_id, 1) for voter in voters],
+                              [Comment("comment", author) for author in authors]),
+    }
+    for name, build in layouts.items():
+        gc.collect()
+        tracemalloc.start()
+        entities = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:12} {current / 2**20:8.1f} MiB for {votes:,} votes and {comments:,} comments "
+              f"({current / (votes + comments):.0f} bytes each)")
+        del entities
+
+# Compares the columnar snapshot against pickling the whole system: file size, save time,
+# time until the first read after loading, and time to materialize the full graph
+def benchmark_snapshot(path: str = "stackoverflow.snapshot", **dump_options: int) -> None:
+    system = StackOverflow()
+    system.bulk_load(generate_dump(**dump_options))
+    question_id = next(iter(system.questions))
+
+    # The object graph is deep as well as cyclic, so pickle may exceed the recursion limit
+    try:
+        start = time.perf_counter()
+        pickled = pickle.dumps(system, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle_save = time.perf_counter() - start
+        start = time.perf_counter()
+        pickle.loads(pickled).get_question(question_id)
+        pickle_load = time.perf_counter() - start
+        print(f"pickle:   {len(pickled) / 2**20:6.1f} MiB, save {pickle_save:.2f}s, first read after {pickle_load:.2f}s")
+    except RecursionError:
+        print("pickle:   failed (maximum recursion depth exceeded)")
+
+    start = time.perf_counter()
+    system.save_snapshot(path)
+    snapshot_save = time.perf_counter() - start
+    restored = StackOverflow()
+    start = time.perf_counter()
+    restored.load_snapshot(path)
+    restored.get_question(question_id)
+    snapshot_load = time.perf_counter() - start
+    start = time.perf_counter()
+    restored.get_top_questions(10)
+    materialize = time.perf_counter() - start
+    size = os.path.getsize(path)
+    os.remove(path)
+
+    print(f"snapshot: {size / 2**20:6.1f} MiB, save {snapshot_save:.2f}s, first read after {snapshot_load:.2f}s, "
+          f"full graph +{materialize:.2f}s")
+
+# Compares search_questions (posting lists) against scan_questions (linear scan)
+def benchmark_search(question_count: int = 100_000, queries: int = 200, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    tag_names = [f"tag{i}" for i in range(200)]
+    bench = StackOverflow()
+    author = bench.create_user("bench", "bench@example.com")
+    for _ in range(question_count):
+        bench.post_question(author, " ".join(rng.choices(vocabulary, k=8)), " ".join(rng.choices(vocabulary, k=40)),
+                            rng.sample(tag_names, 3))
+    terms = [rng.choice(vocabulary) for _ in range(queries)]
+
+    start = time.perf_counter()
+    for term in terms:
+        bench.scan_questions(term)
+    scan_ms = (time.perf_counter() - start) / queries * 1000
+
+    start = time.perf_counter()
+    for term in terms:
+        bench.search_questions(term)
+    index_ms = (time.perf_counter() - start) / queries * 1000
+
+    print(f"scan_questions:   {scan_ms:.3f} ms/query over {question_count:,} questions")
+    print(f"search_questions: {index_ms:.3f} ms/query ({scan_ms / index_ms:.0f}x)")
+
 
 system = StackOverflow()
 
@@ -314,6 +1690,49 @@ bob_questions = system.get_questions_by_users(bob)
 for q in bob_questions:
     print(q.title)
 
+# Multi-term queries: AND needs every term, OR any
+print("\nSearch Results for 'python java' (or):")
+for q in system.search_questions("python java", mode="or"):
+    print(q.title)
+
+# Front page and top answers from the ranking indexes
+print("\nTop Questions by Score:")
+for q in system.get_top_questions(5, by="score"):
+    print(f"{q.title} ({q.get_votes()})")
+print(f"Top answer to '{java_question.title}': {system.get_top_answers(java_question, 1)[0].content[:40]}...")
+
+print(f"Search cache: {system.search_cache.get_stats()}")
+
+# Cursor pagination: one question per page, newest first
+page, cursor = system.search_page("python java", limit=1, mode="or")
+print(f"Page 1: {[q.title for q in page]}")
+page, cursor = system.search_page("python java", limit=1, cursor=cursor, mode="or")
+print(f"Page 2: {[q.title for q in page]}, more: {cursor is not None}")
+
+# Interned tags: per-tag question lists and co-occurring tags
+print(f"\nQuestions tagged 'java': {[q.title for q in system.questions_by_tag('java')]}")
+print(f"Related to 'java': {system.related_tags('java')}")
+
+# Prefix lookup over usernames and emails, and a user's activity timeline page by page
+print(f"\nUsers matching 'a': {[user.user_name for user in system.find_users('a')]}")
+print(f"Users with email 'charlie': {[user.email for user in system.find_users('charlie', by='email')]}")
+page, cursor = system.activity_page(system.get_user_by_name("alice123"), limit=2)
+print(f"Alice's latest activity: {[type(entity).__name__ for entity in page]}, more: {cursor is not None}")
+
+# Reputation ledger: a changed vote reverses its earlier delta, and rules can be replayed
+system.vote_answer(charlie, bob_answer, -1)  # Charlie changes the upvote to a downvote
+print(f"\nBob after Charlie's downvote: {bob.reputation}")
+system.recompute_reputation({**REPUTATION_RULES, "answer": 15})
+print(f"Bob with 15 points per answer: {bob.reputation} ({len(system.reputation_ledger)} ledger events)")
+system.recompute_reputation(REPUTATION_RULES)
+
+# benchmark_search()
+# benchmark_bulk_load()
+# benchmark_reputation_recompute()
+# stress_test_concurrent()
+# benchmark_entity_memory()
+# benchmark_snapshot()
+
 # 1. Responsibility-Driven Design (SRP)
 # Each class in your system has a clear, single responsibility:
 
@@ -8,14 +8,56 @@ queries of average transit time between a pair of stations.
 
 RiderTrip	Composition — system has-a RiderTrip
 TripStats	Composition — system has-a TripStats
+SketchTripStats	Inheritance — TripStats plus a mergeable DDSketch for percentiles, selectable via stats_factory
+RollingTripStats	Composition — optional per-pair ring buffer of time buckets for windowed averages
 SwipeEvent	Behavioral — represents an external action
 TransitSystem - Composes other classes, processes behavior
+CompactTransitSystem - Same queries over interned station IDs and array-backed columns, for memory
+iter_swipe_batches - Parses swipe logs into column batches for bulk ingestion
+parallel_ingest_csv - Splits a swipe log into line-aligned byte ranges across worker processes and stitches their states
+SwipeServer - asyncio TCP/Unix-socket front end applying swipe batches and answering queries live
 """
+from array import array
+from collections import deque
+from heapq import heapify, heappop, heappush
 from io import StringIO
+from itertools import accumulate, chain, islice
+from operator import itemgetter
+import asyncio
 import csv
+import gc
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import struct
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import numpy as np
+except ImportError:  # Optional: get_od_matrix falls back to nested lists
+    np = None
+
+SWIPE_COLUMNS = ("card_id", "station_id", "is_entry", "timestamp")
+
+# Snapshot segment header: magic, kind, then the byte length of each string blob and the
+# record counts. A snapshot file is one full segment followed by any number of deltas.
+SNAPSHOT_MAGIC = b"TSNP"
+SNAPSHOT_FULL, SNAPSHOT_DELTA = 0, 1
+SNAPSHOT_HEADER = struct.Struct("<4sB3xQQQQQQQ")
+SNAPSHOT_RIDE_SIZE = array("I").itemsize + array("q").itemsize       # station index, start time
+SNAPSHOT_PAIR_SIZE = 2 * array("I").itemsize + 2 * array("q").itemsize  # start, end, total, count
 
 # Represents in-progress trip for a rider
 class RiderTrip:
+    __slots__ = ("start_station", "start_time")
+
     def __init__(self, start_station, start_time):
         self.start_station = start_station
         self.start_time = start_time
@@ -30,11 +72,162 @@ class TripStats:
         self.total_time += duration
         self.trip_count += 1
 
+    def merge(self, other):
+        # Exact combine of partial stats for the same pair (e.g. from another worker)
+        self.total_time += other.total_time
+        self.trip_count += other.trip_count
+        return self
+
     def get_average(self):
         if self.trip_count == 0:
             return 0.0
         return self.total_time / self.trip_count
 
+# Quantile sketch (DDSketch): durations fall into log-spaced bins, so any quantile is
+# answered within relative_accuracy of the true value and two sketches merge by adding bins
+class DDSketch:
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}  # bin index -> count, for values > 0
+        self.zero_count = 0  # values <= 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # Folds the lowest bins together, trading accuracy on the fast tail for bounded memory
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        folded = sum(self.bins.pop(index) for index in indexes[:excess])
+        target = indexes[excess]
+        self.bins[target] += folded
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def get_quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+# TripStats that also keeps a duration sketch for p50/p95/p99 queries in bounded memory
+class SketchTripStats(TripStats):
+    def __init__(self, relative_accuracy=0.01):
+        super().__init__()
+        self.sketch = DDSketch(relative_accuracy)
+        self.min_time = None
+        self.max_time = None
+
+    def add_trip(self, duration):
+        super().add_trip(duration)
+        self.sketch.add(duration)
+        if self.min_time is None or duration < self.min_time:
+            self.min_time = duration
+        if self.max_time is None or duration > self.max_time:
+            self.max_time = duration
+
+    def merge(self, other):
+        super().merge(other)
+        self.sketch.merge(other.sketch)
+        if other.min_time is not None:
+            self.min_time = other.min_time if self.min_time is None else min(self.min_time, other.min_time)
+            self.max_time = other.max_time if self.max_time is None else max(self.max_time, other.max_time)
+        return self
+
+    def get_percentile(self, q):
+        # q in [0, 1]; estimates are clamped to the exact observed range and p0/p100 are exact
+        if self.trip_count == 0:
+            return 0.0
+        estimate = self.sketch.get_quantile(q)
+        if q == 0:
+            return self.min_time
+        if q == 1:
+            return self.max_time
+        return min(max(estimate, self.min_time), self.max_time)
+
+# Holds trip totals per fixed-width time bucket in a ring buffer, so memory stays bounded
+# and window queries cost O(buckets) regardless of how many trips were recorded
+class RollingTripStats:
+    def __init__(self, bucket_width, bucket_count):
+        self.bucket_width = bucket_width
+        self.bucket_count = bucket_count
+        self.bucket_ids = array("q", [-1]) * bucket_count   # which bucket each slot currently holds
+        self.total_times = array("q", [0]) * bucket_count
+        self.trip_counts = array("q", [0]) * bucket_count
+        self.newest_bucket = -1
+
+    def add_trip(self, duration, timestamp):
+        self._add_to_bucket(timestamp // self.bucket_width, duration, 1)
+
+    def _add_to_bucket(self, bucket, total_time, trip_count):
+        if bucket <= self.newest_bucket - self.bucket_count:
+            return  # Older than the retained window
+        slot = bucket % self.bucket_count
+        if self.bucket_ids[slot] != bucket:
+            self.bucket_ids[slot] = bucket
+            self.total_times[slot] = 0
+            self.trip_counts[slot] = 0
+        self.total_times[slot] += total_time
+        self.trip_counts[slot] += trip_count
+        if bucket > self.newest_bucket:
+            self.newest_bucket = bucket
+
+    def merge(self, other):
+        # Bucket-wise combine; both sides must share the same bucket width
+        if other.bucket_width != self.bucket_width:
+            raise ValueError("Cannot merge rolling stats with different bucket widths")
+        for bucket, total_time, trip_count in zip(other.bucket_ids, other.total_times, other.trip_counts):
+            if trip_count:
+                self._add_to_bucket(bucket, total_time, trip_count)
+        return self
+
+    def get_totals(self, start_time, end_time):
+        # (total_time, trip_count) over trips that ended in buckets overlapping [start_time, end_time)
+        first = max(start_time // self.bucket_width, self.newest_bucket - self.bucket_count + 1)
+        last = min((end_time - 1) // self.bucket_width, self.newest_bucket)
+        total_time = trip_count = 0
+        for bucket in range(first, last + 1):
+            slot = bucket % self.bucket_count
+            if self.bucket_ids[slot] == bucket:
+                total_time += self.total_times[slot]
+                trip_count += self.trip_counts[slot]
+        return total_time, trip_count
+
+    def get_average(self, start_time, end_time):
+        total_time, trip_count = self.get_totals(start_time, end_time)
+        if trip_count == 0:
+            return 0.0
+        return total_time / trip_count
+
 # Represents a swipe event
 class SwipeEvent:
     def __init__(self, card_id, station_id, is_entry, timestamp):
@@ -43,26 +236,396 @@ class SwipeEvent:
         self.is_entry = is_entry
         self.timestamp = timestamp
 
+# Parses a swipe log into batches of typed columns, skipping the per-row dict and SwipeEvent
+def iter_swipe_batches(source, chunk_size=65536):
+    """Yield (card_ids, station_ids, is_entry, timestamps) column batches.
+
+    source is a file path or an open text stream (any iterable of lines) with a header
+    row naming the card_id, station_id, is_entry and timestamp columns (in any order).
+    """
+    stream = open(source, newline="") if isinstance(source, str) else source
+    try:
+        reader = csv.reader(stream, skipinitialspace=True)
+        header = next(reader, None)
+        if header is None:
+            return
+        pick = itemgetter(*(header.index(name) for name in SWIPE_COLUMNS))
+        while True:
+            rows = [row for row in islice(reader, chunk_size) if row]
+            if not rows:
+                break
+            card_ids, station_ids, flags, times = zip(*map(pick, rows))
+            is_entry = array("b", [flag.lower() == "true" for flag in flags])
+            timestamps = array("q", map(int, times))
+            yield card_ids, station_ids, is_entry, timestamps
+    finally:
+        if stream is not source:
+            stream.close()
+
+# Encodes one snapshot segment as columns: NUL-joined string blobs plus fixed-width arrays,
+# so the loader can bulk-copy each column instead of decoding record by record
+def _pack_snapshot_segment(kind, rides, removed_cards, pairs, expired_trips):
+    stations = {}
+    for _, station, _ in rides:
+        stations.setdefault(station, len(stations))
+    for (start, end), _ in pairs:
+        stations.setdefault(start, len(stations))
+        stations.setdefault(end, len(stations))
+
+    station_blob = "\0".join(stations).encode()
+    card_blob = "\0".join(card_id for card_id, _, _ in rides).encode()
+    removed_blob = "\0".join(removed_cards).encode()
+    ride_stations = array("I", [stations[station] for _, station, _ in rides])
+    ride_times = array("q", [start_time for _, _, start_time in rides])
+    pair_starts = array("I", [stations[start] for (start, _), _ in pairs])
+    pair_ends = array("I", [stations[end] for (_, end), _ in pairs])
+    pair_totals = array("q", [stats.total_time for _, stats in pairs])
+    pair_counts = array("q", [stats.trip_count for _, stats in pairs])
+
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, kind, len(station_blob), len(card_blob), len(removed_blob),
+                                  len(rides), len(removed_cards), len(pairs), expired_trips)
+    return b"".join((header, station_blob, card_blob, removed_blob, ride_stations.tobytes(), ride_times.tobytes(),
+                     pair_starts.tobytes(), pair_ends.tobytes(), pair_totals.tobytes(), pair_counts.tobytes()))
+
+# Yields decoded segments from a memory-mapped snapshot file, in write order, each with the
+# byte offset where it ends. Every column is a bulk copy (array.frombytes / one utf-8 decode
+# + split), never a per-record parse. A trailing delta cut short by a crash mid-append is
+# dropped, so the checkpoint still loads as of the last complete save.
+def _iter_snapshot_segments(path):
+    with open(path, "rb") as stream, mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        offset = 0
+        while offset < len(mapped):
+            if offset + SNAPSHOT_HEADER.size > len(mapped):
+                if offset == 0:
+                    raise ValueError(f"Truncated transit snapshot {path}")
+                return
+            (magic, kind, station_len, card_len, removed_len,
+             ride_count, removed_count, pair_count, expired_trips) = SNAPSHOT_HEADER.unpack_from(mapped, offset)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a transit snapshot segment at byte {offset}")
+            end = (offset + SNAPSHOT_HEADER.size + station_len + card_len + removed_len
+                   + ride_count * SNAPSHOT_RIDE_SIZE + pair_count * SNAPSHOT_PAIR_SIZE)
+            if end > len(mapped):
+                if kind == SNAPSHOT_FULL:
+                    raise ValueError(f"Truncated full snapshot segment at byte {offset}")
+                return
+            offset += SNAPSHOT_HEADER.size
+
+            strings = []
+            for size, count in ((station_len, ride_count or pair_count), (card_len, ride_count),
+                                (removed_len, removed_count)):
+                strings.append(mapped[offset:offset + size].decode().split("\0") if count else [])
+                offset += size
+            columns = []
+            for typecode, count in (("I", ride_count), ("q", ride_count), ("I", pair_count),
+                                    ("I", pair_count), ("q", pair_count), ("q", pair_count)):
+                column = array(typecode)
+                column.frombytes(mapped[offset:offset + count * column.itemsize])
+                offset += count * column.itemsize
+                columns.append(column)
+            stations, card_ids, removed_cards = strings
+            yield (kind, expired_trips, card_ids, stations, removed_cards, *columns, end)
+
 # Transit system using explicit composition
 class TransitSystem:
-    def __init__(self):
+    def __init__(self, bucket_width=None, bucket_count=96, stats_factory=TripStats,
+                 trip_timeout=None, expiry_tick=60, rank_pairs=False):
         self.active_rides = {}  # card_id -> RiderTrip
         self.trip_stats = {}    # (start, end) -> TripStats
+        # Opt-in "slowest pairs" index: a max-heap of (-average, trip_count, pair) with lazy
+        # deletion; an entry is live while its trip_count matches the pair's current count
+        self.slowest_heap = [] if rank_pairs else None
+        self.stats_factory = stats_factory  # e.g. SketchTripStats to enable get_percentile
+        # Abandoned-trip expiry is opt-in: open trips older than trip_timeout are evicted,
+        # at expiry_tick granularity, as swipe timestamps advance
+        self.trip_timeout = trip_timeout
+        self.expiry_tick = expiry_tick
+        self.expiry_buckets = {}  # deadline tick -> [(card_id, RiderTrip)]
+        self.expiry_cursor = 0    # every tick below this has been swept
+        self.expiry_due = 0 if trip_timeout is not None else math.inf
+        self.expired_trips = 0
+        # Windowed stats are opt-in: bucket_width time units per bucket, bucket_count buckets kept per pair
+        self.bucket_width = bucket_width
+        self.bucket_count = bucket_count
+        self.rolling_stats = {} if bucket_width else None  # (start, end) -> RollingTripStats
+        self.clock = 0  # Latest trip end time seen, the "now" for windowed queries
+        # Change tracking for incremental snapshots; None until a snapshot has been saved or loaded
+        self.snapshot_path = None
+        self.dirty_cards = None
+        self.dirty_pairs = None
 
     def process_swipe(self, event: SwipeEvent):
+        if event.timestamp >= self.expiry_due:
+            self.expire_trips(event.timestamp)
+        if self.dirty_cards is not None:
+            self.dirty_cards.add(event.card_id)
         if event.is_entry:
-            self.active_rides[event.card_id] = RiderTrip(event.station_id, event.timestamp)
+            trip = self.active_rides[event.card_id] = RiderTrip(event.station_id, event.timestamp)
+            if self.trip_timeout is not None:
+                self._schedule_expiry(event.card_id, trip)
         else:
             if event.card_id not in self.active_rides:
                 return  # Defensive coding for invalid exit
             trip = self.active_rides.pop(event.card_id)
-            duration = event.timestamp - trip.start_time
-            key = (trip.start_station, event.station_id)
-            
-            if key not in self.trip_stats:
-                self.trip_stats[key] = TripStats()
-                
-            self.trip_stats[key].add_trip(duration)
+            self._record_trip(trip, event.station_id, event.timestamp)
+
+    def _schedule_expiry(self, card_id, trip):
+        # Never schedule behind the cursor, or a late-arriving entry would never be swept
+        tick = max((trip.start_time + self.trip_timeout) // self.expiry_tick, self.expiry_cursor)
+        bucket = self.expiry_buckets.get(tick)
+        if bucket is None:
+            bucket = self.expiry_buckets[tick] = []
+        bucket.append((card_id, trip))
+
+    def expire_trips(self, now):
+        # Sweeps every deadline tick that has fully passed. Each scheduled trip is visited
+        # once, so eviction is amortized O(1); long idle gaps jump straight to the due ticks.
+        if self.trip_timeout is None:
+            return 0
+        now_tick = now // self.expiry_tick
+        if now_tick <= self.expiry_cursor:
+            return 0
+        if now_tick - self.expiry_cursor > len(self.expiry_buckets):
+            due_ticks = sorted(tick for tick in self.expiry_buckets if tick < now_tick)
+        else:
+            due_ticks = range(self.expiry_cursor, now_tick)
+        expired = 0
+        for tick in due_ticks:
+            for card_id, trip in self.expiry_buckets.pop(tick, ()):
+                if self.active_rides.get(card_id) is trip:  # Skip cards that exited or re-entered
+                    del self.active_rides[card_id]
+                    expired += 1
+                    if self.dirty_cards is not None:
+                        self.dirty_cards.add(card_id)
+        self.expiry_cursor = now_tick
+        self.expiry_due = (now_tick + 1) * self.expiry_tick
+        self.expired_trips += expired
+        return expired
+
+    def _record_trip(self, trip, end_station, end_time):
+        duration = end_time - trip.start_time
+        key = (trip.start_station, end_station)
+        stats = self.trip_stats.get(key)
+        if stats is None:
+            stats = self.trip_stats[key] = self.stats_factory()
+        stats.add_trip(duration)
+        if self.dirty_pairs is not None:
+            self.dirty_pairs.add(key)
+        if self.slowest_heap is not None:
+            heappush(self.slowest_heap, (-stats.get_average(), stats.trip_count, key))
+            if len(self.slowest_heap) > 2 * len(self.trip_stats) + 64:
+                self._rebuild_slowest_heap()
+
+        if self.rolling_stats is not None:
+            rolling = self.rolling_stats.get(key)
+            if rolling is None:
+                rolling = self.rolling_stats[key] = RollingTripStats(self.bucket_width, self.bucket_count)
+            rolling.add_trip(duration, end_time)
+            if end_time > self.clock:
+                self.clock = end_time
+
+    def process_batch(self, card_ids, station_ids, is_entry, timestamps):
+        # Same rules as process_swipe, applied column-wise with locals bound once per batch
+        active_rides = self.active_rides
+        record_trip = self._record_trip
+        schedule_expiry = self._schedule_expiry if self.trip_timeout is not None else None
+        expiry_due = self.expiry_due
+        dirty_cards = self.dirty_cards
+        for card_id, station_id, entry, timestamp in zip(card_ids, station_ids, is_entry, timestamps):
+            if timestamp >= expiry_due:
+                self.expire_trips(timestamp)
+                expiry_due = self.expiry_due
+            if dirty_cards is not None:
+                dirty_cards.add(card_id)
+            if entry:
+                trip = active_rides[card_id] = RiderTrip(station_id, timestamp)
+                if schedule_expiry is not None:
+                    schedule_expiry(card_id, trip)
+                continue
+            trip = active_rides.pop(card_id, None)
+            if trip is None:
+                continue  # Defensive coding for invalid exit
+            record_trip(trip, station_id, timestamp)
+
+    def ingest_csv(self, source, chunk_size=65536):
+        # Bulk path for large swipe logs; returns the number of rows applied.
+        # The cyclic GC is paused while loading: the batches allocate millions of acyclic
+        # objects and would otherwise trigger repeated full scans of the live rides.
+        rows = 0
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for batch in iter_swipe_batches(source, chunk_size):
+                self.process_batch(*batch)
+                rows += len(batch[3])
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return rows
+
+    def save_snapshot(self, path, incremental=False):
+        """Checkpoint active_rides and trip_stats to path.
+
+        A full snapshot rewrites the file. incremental=True appends a delta segment holding
+        only the rides and pairs touched since the last save or load of this same file.
+        Card and station IDs must be strings, as parsed from swipe logs.
+        """
+        if self.stats_factory is not TripStats or self.rolling_stats is not None:
+            raise ValueError("Snapshots cover plain TripStats only, without windowed stats")
+        if incremental:
+            if self.dirty_cards is None or self.snapshot_path != path:
+                raise ValueError(f"No base snapshot at {path}; save a full snapshot first")
+            rides, removed_cards = [], []
+            for card_id in self.dirty_cards:
+                trip = self.active_rides.get(card_id)
+                if trip is None:
+                    removed_cards.append(card_id)
+                else:
+                    rides.append((card_id, trip.start_station, trip.start_time))
+            pairs = [(key, self.trip_stats[key]) for key in self.dirty_pairs]
+            segment = _pack_snapshot_segment(SNAPSHOT_DELTA, rides, removed_cards, pairs, self.expired_trips)
+            mode = "ab"
+        else:
+            rides = [(card_id, trip.start_station, trip.start_time) for card_id, trip in self.active_rides.items()]
+            segment = _pack_snapshot_segment(SNAPSHOT_FULL, rides, [], list(self.trip_stats.items()), self.expired_trips)
+            mode = "wb"
+        with open(path, mode) as stream:
+            stream.write(segment)
+            stream.flush()
+            os.fsync(stream.fileno())
+        self.snapshot_path = path
+        self.dirty_cards = set()
+        self.dirty_pairs = set()
+
+    def load_snapshot(self, path):
+        # Replaces this system's rides and stats with the snapshot plus its deltas, in order.
+        # A torn trailing delta is cut off the file, so the next incremental save appends cleanly.
+        if self.stats_factory is not TripStats or self.rolling_stats is not None:
+            raise ValueError("Snapshots cover plain TripStats only, without windowed stats")
+        self.active_rides = {}
+        self.trip_stats = {}
+        loaded_bytes = 0
+        for (kind, expired_trips, card_ids, stations, removed_cards, ride_stations, ride_times,
+             pair_starts, pair_ends, pair_totals, pair_counts, loaded_bytes) in _iter_snapshot_segments(path):
+            if kind == SNAPSHOT_FULL:
+                self.active_rides.clear()
+                self.trip_stats.clear()
+            for card_id in removed_cards:
+                self.active_rides.pop(card_id, None)
+            self.active_rides.update(zip(card_ids, map(RiderTrip, map(stations.__getitem__, ride_stations), ride_times)))
+            for start, end, total_time, trip_count in zip(pair_starts, pair_ends, pair_totals, pair_counts):
+                stats = TripStats()
+                stats.total_time, stats.trip_count = total_time, trip_count
+                self.trip_stats[(stations[start], stations[end])] = stats
+            self.expired_trips = expired_trips
+        if os.path.getsize(path) > loaded_bytes:
+            os.truncate(path, loaded_bytes)
+
+        self.expiry_buckets = {}
+        self.expiry_cursor = 0
+        if self.trip_timeout is not None:
+            self.expiry_due = 0
+            for card_id, trip in self.active_rides.items():
+                self._schedule_expiry(card_id, trip)
+        if self.slowest_heap is not None:
+            self._rebuild_slowest_heap()
+        self.snapshot_path = path
+        self.dirty_cards = set()
+        self.dirty_pairs = set()
+
+    def _rebuild_slowest_heap(self):
+        # Drops stale entries in O(pairs); triggered once the heap is twice the live size
+        self.slowest_heap = [(-stats.get_average(), stats.trip_count, key) for key, stats in self.trip_stats.items()]
+        heapify(self.slowest_heap)
+
+    def get_slowest_pairs(self, k=20, min_trips=1):
+        # Top-k (start, end, average) by average time, slowest first, in O((k + stale) log pairs)
+        if self.slowest_heap is None:
+            raise ValueError("Pair ranking is disabled; construct TransitSystem with rank_pairs=True")
+        heap = self.slowest_heap
+        result, skipped = [], []
+        while heap and len(result) < k:
+            entry = heappop(heap)
+            negative_average, trip_count, key = entry
+            stats = self.trip_stats.get(key)
+            if stats is None or stats.trip_count != trip_count:
+                continue  # Stale: superseded by a newer entry for this pair
+            skipped.append(entry)
+            if trip_count >= min_trips:
+                result.append((key[0], key[1], -negative_average))
+        for entry in skipped:
+            heappush(heap, entry)
+        return result
+
+    def get_od_matrix(self, stations=None):
+        """Return (stations, matrix) where matrix[i][j] is the average time from stations[i] to stations[j].
+
+        Pairs without trips are 0.0. stations defaults to every station seen in trip_stats,
+        sorted. The matrix is a NumPy array when NumPy is installed, else nested lists.
+        """
+        if stations is None:
+            stations = sorted({station for pair in self.trip_stats for station in pair})
+        index = {station: i for i, station in enumerate(stations)}
+        pairs = [(index[start], index[end], stats.total_time, stats.trip_count)
+                 for (start, end), stats in self.trip_stats.items() if start in index and end in index]
+        size = len(stations)
+        if np is None:
+            matrix = [[0.0] * size for _ in range(size)]
+            for start, end, total_time, trip_count in pairs:
+                if trip_count:
+                    matrix[start][end] = total_time / trip_count
+            return stations, matrix
+
+        total_matrix = np.zeros((size, size))
+        count_matrix = np.zeros((size, size))
+        if pairs:
+            starts, ends, totals, counts = (np.array(column) for column in zip(*pairs))
+            total_matrix[starts, ends] = totals
+            count_matrix[starts, ends] = counts
+        return stations, np.divide(total_matrix, count_matrix, out=np.zeros((size, size)), where=count_matrix > 0)
+
+    def merge(self, other):
+        # Folds in another system's state; the two own disjoint cards, so open rides never collide
+        self.active_rides.update(other.active_rides)
+        for key, stats in other.trip_stats.items():
+            if key in self.trip_stats:
+                self.trip_stats[key].merge(stats)
+            else:
+                self.trip_stats[key] = stats
+        if self.rolling_stats is not None and other.rolling_stats is not None:
+            for key, rolling in other.rolling_stats.items():
+                if key in self.rolling_stats:
+                    self.rolling_stats[key].merge(rolling)
+                else:
+                    self.rolling_stats[key] = rolling
+            self.clock = max(self.clock, other.clock)
+        if self.trip_timeout is not None and other.trip_timeout is not None:
+            # Re-sweep from the laggier side's cursor up to the furthest one
+            self.expired_trips += other.expired_trips
+            for tick, bucket in other.expiry_buckets.items():
+                self.expiry_buckets.setdefault(tick, []).extend(bucket)
+            furthest = max(self.expiry_cursor, other.expiry_cursor)
+            self.expiry_cursor = min(self.expiry_cursor, other.expiry_cursor)
+            self.expire_trips(furthest * self.expiry_tick)
+        if self.dirty_cards is not None:
+            self.snapshot_path = self.dirty_cards = self.dirty_pairs = None  # Next save must be full
+        if self.slowest_heap is not None:
+            self._rebuild_slowest_heap()
+        return self
+
+    def merge_following(self, other, first_swipes):
+        # Folds in a system that replayed, from a blank state, the swipes right after this
+        # one's. first_swipes is each card's first (card_id, station_id, is_entry, timestamp)
+        # there, in log order: an exit closes the ride still open here, an entry replaced it,
+        # so afterwards the cards are disjoint and the rest is a plain merge
+        active_rides = self.active_rides
+        for card_id, station_id, entry, timestamp in first_swipes:
+            if timestamp >= self.expiry_due:
+                self.expire_trips(timestamp)
+            trip = active_rides.pop(card_id, None)
+            if trip is not None and not entry:
+                self._record_trip(trip, station_id, timestamp)
+        return self.merge(other)
 
     def get_average_time(self, start_station, end_station):
         stats = self.trip_stats.get((start_station, end_station))
@@ -70,11 +633,532 @@ class TransitSystem:
             return 0.0
         return stats.get_average()
 
+    def get_percentile(self, start_station, end_station, q):
+        # Approximate q-quantile (0..1) of transit time, e.g. q=0.99 for p99
+        if not hasattr(self.stats_factory, "get_percentile"):
+            raise ValueError("Percentiles are disabled; construct TransitSystem with stats_factory=SketchTripStats")
+        stats = self.trip_stats.get((start_station, end_station))
+        if not stats:
+            return 0.0
+        return stats.get_percentile(q)
+
+    def get_window_average_time(self, start_station, end_station, start_time, end_time):
+        # Average over trips that ended within [start_time, end_time), at bucket granularity
+        if self.rolling_stats is None:
+            raise ValueError("Windowed stats are disabled; construct TransitSystem with a bucket_width")
+        rolling = self.rolling_stats.get((start_station, end_station))
+        if not rolling:
+            return 0.0
+        return rolling.get_average(start_time, end_time)
+
+    def get_recent_average_time(self, start_station, end_station, duration):
+        # Average over the last `duration` time units, e.g. the last 15 minutes of trips
+        return self.get_window_average_time(start_station, end_station, self.clock - duration + 1, self.clock + 1)
+
     def print_trip_stats(self):
         for (start, end), stats in self.trip_stats.items():
             print(f"From '{start}' to '{end}': total_time = {stats.total_time}, trip_count = {stats.trip_count}, average_time = {stats.get_average():.2f}")
 
-csv_data = StringIO(
+# Memory-lean backend: stations are interned to small ints, open trips live in array
+# columns addressed by a per-card slot, and pair stats form a dense station-ID matrix
+# (row-major, start * capacity + end), which suits network-sized station counts
+class CompactTransitSystem:
+    def __init__(self, station_capacity=64):
+        self.station_ids = {}    # station name -> station ID
+        self.station_names = []  # station ID -> station name
+        self.ride_slots = {}     # card_id -> slot in the open-trip columns
+        self.ride_stations = array("i")
+        self.ride_times = array("q")
+        self.free_slots = []
+        self.capacity = station_capacity
+        self.pair_total_times = array("q", bytes(8 * station_capacity * station_capacity))
+        self.pair_trip_counts = array("q", bytes(8 * station_capacity * station_capacity))
+
+    def _intern(self, station):
+        station_id = self.station_ids.get(station)
+        if station_id is None:
+            station_id = self.station_ids[station] = len(self.station_names)
+            self.station_names.append(station)
+            if station_id >= self.capacity:
+                self._grow_matrix(self.capacity * 2)
+        return station_id
+
+    def _grow_matrix(self, capacity):
+        # Re-lays the matrix with a wider stride; amortized by doubling
+        old, totals, counts = self.capacity, self.pair_total_times, self.pair_trip_counts
+        self.capacity = capacity
+        self.pair_total_times = array("q", bytes(8 * capacity * capacity))
+        self.pair_trip_counts = array("q", bytes(8 * capacity * capacity))
+        for start in range(old):
+            self.pair_total_times[start * capacity:start * capacity + old] = totals[start * old:(start + 1) * old]
+            self.pair_trip_counts[start * capacity:start * capacity + old] = counts[start * old:(start + 1) * old]
+
+    def process_swipe(self, event: SwipeEvent):
+        self.process_batch((event.card_id,), (event.station_id,), (event.is_entry,), (event.timestamp,))
+
+    def process_batch(self, card_ids, station_ids, is_entry, timestamps):
+        ride_slots = self.ride_slots
+        ride_stations = self.ride_stations
+        ride_times = self.ride_times
+        free_slots = self.free_slots
+        intern = self._intern
+        for card_id, station, entry, timestamp in zip(card_ids, station_ids, is_entry, timestamps):
+            station_id = intern(station)
+            if entry:
+                slot = ride_slots.get(card_id)
+                if slot is None:
+                    if free_slots:
+                        slot = free_slots.pop()
+                    else:
+                        slot = len(ride_times)
+                        ride_stations.append(0)
+                        ride_times.append(0)
+                    ride_slots[card_id] = slot
+                ride_stations[slot] = station_id
+                ride_times[slot] = timestamp
+                continue
+            slot = ride_slots.pop(card_id, None)
+            if slot is None:
+                continue  # Defensive coding for invalid exit
+            free_slots.append(slot)
+            cell = ride_stations[slot] * self.capacity + station_id  # capacity may grow mid-batch
+            self.pair_total_times[cell] += timestamp - ride_times[slot]
+            self.pair_trip_counts[cell] += 1
+
+    ingest_csv = TransitSystem.ingest_csv  # Same chunked parsing, feeding this class's process_batch
+
+    def get_average_time(self, start_station, end_station):
+        start_id = self.station_ids.get(start_station)
+        end_id = self.station_ids.get(end_station)
+        if start_id is None or end_id is None:
+            return 0.0
+        cell = start_id * self.capacity + end_id
+        if self.pair_trip_counts[cell] == 0:
+            return 0.0
+        return self.pair_total_times[cell] / self.pair_trip_counts[cell]
+
+    def print_trip_stats(self):
+        for cell, trip_count in enumerate(self.pair_trip_counts):
+            if trip_count == 0:
+                continue
+            start, end = self.station_names[cell // self.capacity], self.station_names[cell % self.capacity]
+            total_time = self.pair_total_times[cell]
+            print(f"From '{start}' to '{end}': total_time = {total_time}, trip_count = {trip_count}, average_time = {total_time / trip_count:.2f}")
+
+# Splits a log's data rows into up to `parts` byte ranges, each starting at a line start.
+# Returns the header line and the non-empty (start, end) ranges in file order.
+def _split_line_ranges(path, parts):
+    with open(path, "rb") as stream:
+        header = stream.readline()
+        size = os.fstat(stream.fileno()).st_size
+        bounds = [len(header)]
+        for part in range(1, parts):
+            stream.seek(max(len(header) + (size - len(header)) * part // parts - 1, bounds[-1]))
+            stream.readline()  # Runs to the end of the line the cut fell in
+            bounds.append(max(stream.tell(), bounds[-1]))
+        bounds.append(size)
+    return header.decode(), [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+# Text lines of path between two line-aligned byte offsets, decoded a block at a time
+def _iter_line_range(path, start, end, block_size=1 << 22):
+    with open(path, "rb") as stream:
+        stream.seek(start)
+        while start < end:
+            block = stream.read(min(block_size, end - start))
+            if not block:
+                break
+            if start + len(block) < end and not block.endswith(b"\n"):
+                block += stream.readline()
+            start += len(block)
+            yield StringIO(block.decode(), newline="")
+
+# Worker for parallel_ingest_csv: parses and replays one byte range of the log from a blank
+# state, and notes each card's first swipe there so the parent can stitch ranges in order
+def _range_worker(path, header, index, start, end, chunk_size, results, options):
+    gc.disable()
+    system = TransitSystem(**options)
+    seen, first_swipes = set(), []
+    lines = chain((header,), chain.from_iterable(_iter_line_range(path, start, end)))
+    for batch in iter_swipe_batches(lines, chunk_size):
+        card_ids = batch[0]
+        first_rows = dict(zip(reversed(card_ids), range(len(card_ids) - 1, -1, -1)))
+        rows = sorted(map(first_rows.__getitem__, first_rows.keys() - seen))
+        first_swipes.extend(zip(*(map(column.__getitem__, rows) for column in batch)))
+        seen.update(first_rows)
+        system.process_batch(*batch)
+    results.put((index, system, first_swipes))
+
+# Waits for a worker's state without hanging forever if a worker died before reporting
+def _next_worker_result(results, processes):
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+    try:
+        return results.get(timeout=1)
+    except queue.Empty:
+        raise RuntimeError("Range worker exited without returning its state") from None
+
+# Replays a swipe log file across worker processes. The file is cut into byte ranges at line
+# boundaries, so each worker reads and parses only its own slice; the parent then stitches
+# the ranges in file order with merge_following, carrying open rides across each cut.
+# A stream can only be read once and parsing it is the bottleneck, so streams replay serially.
+def parallel_ingest_csv(source, workers=None, chunk_size=65536, **options):
+    if not isinstance(source, str):
+        system = TransitSystem(**options)
+        system.ingest_csv(source, chunk_size)
+        return system
+    header, ranges = _split_line_ranges(source, workers or os.cpu_count() or 1)
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    processes = [context.Process(target=_range_worker,
+                                 args=(source, header, index, start, end, chunk_size, results, options), daemon=True)
+                 for index, (start, end) in enumerate(ranges)]
+    for process in processes:
+        process.start()
+
+    try:
+        parts = [None] * len(processes)
+        for _ in processes:
+            index, part, first_swipes = _next_worker_result(results, processes)
+            parts[index] = (part, first_swipes)
+        system = TransitSystem(**options)
+        for part, first_swipes in parts:
+            system.merge_following(part, first_swipes)
+    finally:
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+    return system
+
+# Live ingestion over asyncio. The protocol is one JSON object per line, answered in order
+# with one JSON line, so clients may pipeline requests:
+#   {"op": "swipes", "rows": [[card_id, station_id, is_entry, timestamp], ...]} -> {"ok": <rows>}
+#   {"op": "average", "start": <station>, "end": <station>}                     -> {"average": <time>}
+# Backpressure: each connection handles one request at a time and waits for its reply to
+# drain, so a client that outpaces the system stalls on its own TCP window.
+class SwipeServer:
+    def __init__(self, system, max_request_bytes=8 * 2**20):
+        self.system = system
+        self.max_request_bytes = max_request_bytes
+        self.server = None
+        self.connections = {}  # StreamWriter -> handler task
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path, limit=self.max_request_bytes)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.max_request_bytes)
+        return self.server
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        # Stops accepting, then closes open connections so their handlers see EOF and finish
+        self.server.close()
+        handlers = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"error": "request too large"}\n')
+                    break
+                if not line:
+                    break
+                writer.write(self.dispatch(line))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            del self.connections[writer]
+            writer.close()
+
+    def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+            if op == "swipes":
+                columns = self.swipe_columns(request["rows"])
+                self.system.process_batch(*columns)
+                response = {"ok": len(columns[3])}
+            elif op == "average":
+                response = {"average": self.system.get_average_time(request["start"], request["end"])}
+            else:
+                response = {"error": f"unknown op {op!r}"}
+        except (ValueError, KeyError, TypeError, AttributeError, OverflowError) as error:
+            response = {"error": str(error)}
+        return (json.dumps(response) + "\n").encode()
+
+    # Checks and converts every row before any is applied, so one bad row rejects the whole
+    # batch instead of leaving the rows before it half-applied. IDs may be strings or integers
+    # and are kept as strings, as parsed from swipe logs.
+    @staticmethod
+    def swipe_columns(rows):
+        if not isinstance(rows, list):
+            raise TypeError("rows must be a list of [card_id, station_id, is_entry, timestamp]")
+        card_ids, station_ids, is_entry, timestamps = [], [], array("b"), array("q")
+        for index, row in enumerate(rows):
+            if not isinstance(row, list) or len(row) != 4:
+                raise ValueError(f"row {index}: expected [card_id, station_id, is_entry, timestamp]")
+            card_id, station_id, entry, timestamp = row
+            if type(card_id) not in (str, int) or type(station_id) not in (str, int):
+                raise TypeError(f"row {index}: card_id and station_id must be strings or integers")
+            if type(entry) is not bool:
+                raise TypeError(f"row {index}: is_entry must be true or false")
+            if type(timestamp) is not int:
+                raise TypeError(f"row {index}: timestamp must be an integer")
+            card_ids.append(str(card_id))
+            station_ids.append(str(station_id))
+            is_entry.append(entry)
+            timestamps.append(timestamp)
+        return card_ids, station_ids, is_entry, timestamps
+
+# Pipelined load generator for SwipeServer: keeps up to `window` requests in flight on one
+# connection and reports swipes/sec plus p50/p99 request latency
+async def run_load_generator(host="127.0.0.1", port=None, path=None, batches=2000, batch_size=500,
+                             window=32, query_every=10, stations=50, seed=0):
+    rng = random.Random(seed)
+    names = [f"Station {i}" for i in range(stations)]
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    in_flight = asyncio.Semaphore(window)
+    sent_at = deque()
+    latencies = []
+
+    async def receive(total):
+        for _ in range(total):
+            await reader.readline()
+            latencies.append(time.perf_counter() - sent_at.popleft())
+            in_flight.release()
+
+    requests = batches + batches // query_every
+    receiver = asyncio.ensure_future(receive(requests))
+    start = time.perf_counter()
+    clock = 0
+    open_cards = set()
+    for batch in range(batches):
+        rows = []
+        for _ in range(batch_size):
+            card = str(rng.randrange(batch_size * 20))
+            clock += 1
+            rows.append([card, rng.choice(names), card not in open_cards, clock])
+            open_cards ^= {card}
+        for payload in [{"op": "swipes", "rows": rows}] + (
+                [{"op": "average", "start": rng.choice(names), "end": rng.choice(names)}]
+                if (batch + 1) % query_every == 0 else []):
+            await in_flight.acquire()
+            sent_at.append(time.perf_counter())
+            writer.write((json.dumps(payload) + "\n").encode())
+            await writer.drain()
+    await receiver
+    elapsed = time.perf_counter() - start
+    writer.close()
+    await writer.wait_closed()
+
+    latencies.sort()
+    report = {
+        "swipes_per_sec": batches * batch_size / elapsed,
+        "requests": requests,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+    print(f"{report['swipes_per_sec']:,.0f} swipes/sec, p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms")
+    return report
+
+# Starts a SwipeServer on an ephemeral local port and drives it with the load generator
+async def benchmark_server(**load_options):
+    server = SwipeServer(TransitSystem())
+    await server.start()
+    host, port = server.address()[:2]
+    try:
+        return await run_load_generator(host, port, **load_options)
+    finally:
+        await server.close()
+
+# Synthetic, time-ordered swipe stream as columns (one time unit per swipe). Cards and
+# stations are drawn Zipf-like with exponent `skew` (0 = uniform). A card's next swipe closes
+# its open trip, except that open_ratio of trips are abandoned: the card later taps in again.
+def generate_swipes(events, stations=50, riders=10_000, open_ratio=0.0, skew=0.0, seed=0):
+    rng = random.Random(seed)
+    names = [f"Station {i}" for i in range(stations)]
+    cards = [str(card) for card in range(riders)]
+    station_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(stations)))
+    card_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(riders)))
+
+    card_ids = rng.choices(cards, cum_weights=card_weights, k=events)
+    station_ids = rng.choices(names, cum_weights=station_weights, k=events)
+    is_entry = array("b", bytes(events))
+    riding = set()
+    for i, card_id in enumerate(card_ids):
+        if card_id in riding:
+            riding.remove(card_id)
+        else:
+            is_entry[i] = 1
+            if rng.random() >= open_ratio:
+                riding.add(card_id)
+    return card_ids, station_ids, is_entry, array("q", range(events))
+
+def swipes_to_csv(card_ids, station_ids, is_entry, timestamps):
+    lines = ["card_id, station_id, is_entry, timestamp"]
+    lines += [f"{card_id}, {station_id}, {'true' if entry else 'false'}, {timestamp}"
+              for card_id, station_id, entry, timestamp in zip(card_ids, station_ids, is_entry, timestamps)]
+    return StringIO("\n".join(lines) + "\n")
+
+def generate_swipe_csv(rows, stations=50, seed=0):
+    return swipes_to_csv(*generate_swipes(rows, stations, riders=max(rows // 4, 1), seed=seed))
+
+# Compares rows/sec of the DictReader + SwipeEvent loop against ingest_csv
+def benchmark_ingestion(rows=1_000_000, chunk_size=65536):
+    data = generate_swipe_csv(rows)
+
+    start = time.perf_counter()
+    baseline = TransitSystem()
+    for row in csv.DictReader(data, skipinitialspace=True):
+        baseline.process_swipe(SwipeEvent(
+            card_id=row["card_id"],
+            station_id=row["station_id"],
+            is_entry=row["is_entry"].lower() == "true",
+            timestamp=int(row["timestamp"])
+        ))
+    loop_seconds = time.perf_counter() - start
+
+    data.seek(0)
+    start = time.perf_counter()
+    bulk = TransitSystem()
+    bulk.ingest_csv(data, chunk_size)
+    bulk_seconds = time.perf_counter() - start
+
+    print(f"process_swipe loop:  {rows / loop_seconds:,.0f} rows/sec")
+    print(f"ingest_csv:          {rows / bulk_seconds:,.0f} rows/sec ({loop_seconds / bulk_seconds:.1f}x)")
+
+    log_path = os.path.join(tempfile.mkdtemp(), "swipes.csv")
+    with open(log_path, "w", newline="") as log_file:
+        log_file.write(data.getvalue())
+    start = time.perf_counter()
+    parallel_ingest_csv(log_path, chunk_size=chunk_size)
+    parallel_seconds = time.perf_counter() - start
+    print(f"parallel_ingest_csv: {rows / parallel_seconds:,.0f} rows/sec on {os.cpu_count()} cores")
+
+# Compares traced memory of the dict-of-objects layout against CompactTransitSystem.
+# Each card taps in; open_ratio of them stay open and the rest complete a trip.
+def benchmark_memory(cards=1_000_000, stations=400, open_ratio=0.5, seed=0):
+    rng = random.Random(seed)
+    names = [f"Station {i}" for i in range(stations)]
+    card_ids = [str(card) for card in range(cards)]
+    exits = [card for card in card_ids if rng.random() >= open_ratio]
+    batch = (
+        card_ids + exits,
+        [rng.choice(names) for _ in range(cards + len(exits))],
+        array("b", [1] * cards + [0] * len(exits)),
+        array("q", list(range(cards)) + [cards + rng.randrange(60, 3600) for _ in exits]),
+    )
+
+    for system_class in (TransitSystem, CompactTransitSystem):
+        gc.collect()
+        tracemalloc.start()
+        system = system_class()
+        system.process_batch(*batch)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{system_class.__name__:22} {current / 2**20:8.1f} MiB retained, {peak / 2**20:8.1f} MiB peak "
+              f"({cards - len(exits):,} open trips)")
+        del system
+
+# Reproducible benchmark suite: one synthetic workload, measured per backend for
+# process_swipe, process_batch and ingest_csv throughput, get_average_time latency and
+# peak traced memory (throughput is best of `repeat` runs). Returns (and optionally writes) a JSON-ready dict; compare runs
+# across versions with compare_benchmarks.
+def run_benchmark_suite(events=200_000, stations=100, riders=20_000, open_ratio=0.1, skew=1.0,
+                        queries=20_000, repeat=3, seed=0, output=None):
+    config = {"events": events, "stations": stations, "riders": riders, "open_ratio": open_ratio,
+              "skew": skew, "queries": queries, "repeat": repeat, "seed": seed}
+    swipes = generate_swipes(events, stations, riders, open_ratio, skew, seed)
+    csv_text = swipes_to_csv(*swipes).getvalue()
+    swipe_events = [SwipeEvent(*row) for row in zip(*swipes)]
+    rng = random.Random(seed)
+    names = sorted(set(swipes[1]))
+    query_pairs = [(rng.choice(names), rng.choice(names)) for _ in range(queries)]
+
+    results = {}
+    for system_class in (TransitSystem, CompactTransitSystem):
+        metrics = {}
+
+        def per_event(system):
+            for event in swipe_events:
+                system.process_swipe(event)
+
+        for name, run in (("process_swipe", per_event),
+                          ("process_batch", lambda system: system.process_batch(*swipes)),
+                          ("ingest_csv", lambda system: system.ingest_csv(StringIO(csv_text)))):
+            best = math.inf
+            for _ in range(repeat):
+                system = system_class()
+                start = time.perf_counter()
+                run(system)
+                best = min(best, time.perf_counter() - start)
+            metrics[f"{name}_events_per_sec"] = events / best
+
+            # Peak traced allocation of one more, untimed run; tracing would skew the timings
+            del system
+            gc.collect()
+            tracemalloc.start()
+            system = system_class()
+            run(system)
+            metrics[f"{name}_peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        latencies = []
+        get_average_time = system.get_average_time
+        for start_station, end_station in query_pairs:
+            start = time.perf_counter_ns()
+            get_average_time(start_station, end_station)
+            latencies.append(time.perf_counter_ns() - start)
+        latencies.sort()
+        metrics["get_average_time_p50_ns"] = latencies[len(latencies) // 2]
+        metrics["get_average_time_p99_ns"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        metrics["get_average_time_per_sec"] = len(latencies) / (sum(latencies) / 1e9)
+        del system
+
+        results[system_class.__name__] = metrics
+
+    report = {"config": config, "python": platform.python_version(), "platform": platform.platform(),
+              "timestamp": time.time(), "results": results}
+    if output is not None:
+        with open(output, "w") as stream:
+            json.dump(report, stream, indent=2)
+    return report
+
+# Prints new/old ratios for every metric shared by two run_benchmark_suite reports
+def compare_benchmarks(old_path, new_path):
+    with open(old_path) as stream:
+        old = json.load(stream)
+    with open(new_path) as stream:
+        new = json.load(stream)
+    if old["config"] != new["config"]:
+        print("Warning: reports were produced with different workload configs")
+    for backend, metrics in new["results"].items():
+        for name, value in metrics.items():
+            previous = old["results"].get(backend, {}).get(name)
+            if previous:
+                print(f"{backend:22} {name:32} {previous:>16,.0f} -> {value:>16,.0f} ({value / previous:.2f}x)")
+
+if __name__ == "__main__":
+    csv_data = StringIO(
     """card_id, station_id, is_entry, timestamp
 2, Spring Street, true, 500
 1, Times Square, true, 1000
@@ -86,23 +1170,97 @@ csv_data = StringIO(
 4, Grand Central, true, 30000
 4, Grand Central, false, 30500
 """)
-system = TransitSystem()
-reader = csv.DictReader(csv_data, skipinitialspace=True)
-
-for row in reader:
-    event = SwipeEvent(
-        card_id=row["card_id"],
-        station_id=row["station_id"],
-        is_entry=row["is_entry"].lower() == "true",
-        timestamp=int(row["timestamp"])
-    )
-    system.process_swipe(event)
+    system = TransitSystem()
+    reader = csv.DictReader(csv_data, skipinitialspace=True)
+
+    for row in reader:
+        event = SwipeEvent(
+            card_id=row["card_id"],
+            station_id=row["station_id"],
+            is_entry=row["is_entry"].lower() == "true",
+            timestamp=int(row["timestamp"])
+        )
+        system.process_swipe(event)
+
+    # Bulk ingestion produces the same stats as the per-event loop
+    csv_data.seek(0)
+    bulk_system = TransitSystem()
+    bulk_system.ingest_csv(csv_data)
+    assert {k: (v.total_time, v.trip_count) for k, v in bulk_system.trip_stats.items()} == \
+           {k: (v.total_time, v.trip_count) for k, v in system.trip_stats.items()}
+
+    # Parallel replay over byte ranges of a log file stitches to exactly the single-process result
+    log_path = os.path.join(tempfile.mkdtemp(), "swipes.csv")
+    with open(log_path, "w", newline="") as log_file:
+        log_file.write(csv_data.getvalue())
+    parallel_system = parallel_ingest_csv(log_path, workers=3)
+    assert {k: (v.total_time, v.trip_count) for k, v in parallel_system.trip_stats.items()} == \
+           {k: (v.total_time, v.trip_count) for k, v in system.trip_stats.items()}
+    assert {k: (v.start_station, v.start_time) for k, v in parallel_system.active_rides.items()} == \
+           {k: (v.start_station, v.start_time) for k, v in system.active_rides.items()}
+
+    # Windowed averages: 10000-unit buckets, trips bucketed by exit time
+    windowed_system = TransitSystem(bucket_width=10000, bucket_count=8)
+    csv_data.seek(0)
+    windowed_system.ingest_csv(csv_data)
+    assert windowed_system.get_window_average_time("Times Square", "Grand Central", 0, 10000) == 1000.0
+    assert windowed_system.get_window_average_time("Times Square", "Grand Central", 30000, 40000) == 29000.0
+    assert windowed_system.get_recent_average_time("Grand Central", "Grand Central", 10000) == 500.0
+
+    # Percentiles from mergeable sketches, identical whether replayed on one process or in parallel
+    csv_data.seek(0)
+    sketch_system = TransitSystem(stats_factory=SketchTripStats)
+    sketch_system.ingest_csv(csv_data)
+    assert sketch_system.get_percentile("Times Square", "Grand Central", 0.0) == 1000
+    assert sketch_system.get_percentile("Times Square", "Grand Central", 1.0) == 29000
+    parallel_sketch_system = parallel_ingest_csv(log_path, workers=2, stats_factory=SketchTripStats)
+    assert parallel_sketch_system.get_percentile("Times Square", "Grand Central", 0.5) == \
+           sketch_system.get_percentile("Times Square", "Grand Central", 0.5)
+
+    # Compact backend answers the same queries
+    csv_data.seek(0)
+    compact_system = CompactTransitSystem()
+    compact_system.ingest_csv(csv_data)
+    for start, end in system.trip_stats:
+        assert compact_system.get_average_time(start, end) == system.get_average_time(start, end)
+
+    # Abandoned trips: card 4 re-tapping in at 40000 pushes the clock past card 2's timeout
+    expiring_system = TransitSystem(trip_timeout=5000, expiry_tick=100)
+    expiring_system.process_swipe(SwipeEvent("2", "Spring Street", True, 500))
+    expiring_system.process_swipe(SwipeEvent("4", "Grand Central", True, 40000))
+    assert "2" not in expiring_system.active_rides and expiring_system.expired_trips == 1
+
+    # Checkpoint: full snapshot, then a delta after more swipes; reloading replays both
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "transit.snapshot")
+    checkpointed_system = TransitSystem()
+    checkpointed_system.process_swipe(SwipeEvent("1", "Times Square", True, 1000))
+    checkpointed_system.save_snapshot(snapshot_path)
+    checkpointed_system.process_swipe(SwipeEvent("1", "Grand Central", False, 2000))
+    checkpointed_system.save_snapshot(snapshot_path, incremental=True)
+    restored_system = TransitSystem()
+    restored_system.load_snapshot(snapshot_path)
+    assert restored_system.get_average_time("Times Square", "Grand Central") == 1000.0
+    assert not restored_system.active_rides
+
+    # Planner views: the slowest pairs and the full origin-destination matrix
+    csv_data.seek(0)
+    ranked_system = TransitSystem(rank_pairs=True)
+    ranked_system.ingest_csv(csv_data)
+    assert ranked_system.get_slowest_pairs(2) == [("Spring Street", "Main Street", 19500.0),
+                                                  ("Times Square", "Grand Central", 15000.0)]
+    od_stations, od_matrix = ranked_system.get_od_matrix()
+    assert od_matrix[od_stations.index("Times Square")][od_stations.index("Grand Central")] == 15000.0
+
+    # Example Queries
+    # print(system.get_average_time("Times Square", "Grand Central"))  # 15000.0
+    # print(system.get_average_time("Spring Street", "Main Street"))   # 19500.0
+    # print(system.get_average_time("Grand Central", "Grand Central")) # 500.0
+    print(system.print_trip_stats())
 
-# Example Queries
-# print(system.get_average_time("Times Square", "Grand Central"))  # 15000.0
-# print(system.get_average_time("Spring Street", "Main Street"))   # 19500.0
-# print(system.get_average_time("Grand Central", "Grand Central")) # 500.0
-print(system.print_trip_stats())
+    # benchmark_ingestion()
+    # benchmark_memory()
+    # asyncio.run(benchmark_server())
+    # run_benchmark_suite(output="subway-benchmark.json")
 
 '''
 S — Single Responsibility Principle (SRP)